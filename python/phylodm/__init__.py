@@ -1,12 +1,19 @@
 from __future__ import annotations
 
-from typing import Optional, List
+import json
+import os
+import re
+from typing import Optional, List, Tuple, Dict, Sequence, Union
 
 import dendropy
 import numpy as np
 
 from .pdm import PhyloDM as PDM
 
+TILE_FILE_RE = re.compile(r'^tile_(\d+)_(\d+)_(\d+)_(\d+)\.npy$')
+TILE_MANIFEST = 'manifest.json'
+DEFAULT_MAX_TILE_SIZE = 4096
+
 
 class PhyloDM:
 
@@ -15,15 +22,16 @@ class PhyloDM:
         self._rs = PDM()
 
     @classmethod
-    def load_from_newick_path(cls, path: str) -> 'PhyloDM':
+    def load_from_newick_path(cls, path: str, compute_row_vec: bool = True) -> 'PhyloDM':
         """Load a tree from a Newick file.
 
         Args:
             path: The path to the Newick file.
+            compute_row_vec: If False, the distances are not pre-computed (e.g. when only tiles are needed).
         """
         try:
             pdm = cls()
-            pdm._rs.load_from_newick_path(path=path)
+            pdm._rs.load_from_newick_path(path=path, compute_row_vec=compute_row_vec)
             return pdm
         except Exception as e:
             print(f'Unable to load newick tree using light_phylogeny (Rust). '
@@ -77,6 +85,38 @@ class PhyloDM:
         """
         return self._rs.add_edge(parent_id=parent_id, child_id=child_id, length=length)
 
+    def insert_leaf(self, parent_or_edge: Union[int, str], taxon: str, length: float,
+                    pendant_position: Optional[float] = None) -> int:
+        """Insert a new taxon into the tree. If the distance matrix has been computed, it is
+        updated from the row of a neighbouring taxon rather than re-computed. This still moves
+        O(n^2) values in memory, and occasionally re-allocates the matrix (briefly doubling memory).
+
+        Args:
+            parent_or_edge: The index of a node, or a taxon (i.e. its leaf node).
+            taxon: The new taxon.
+            length: The length of the pendant edge to the new taxon.
+            pendant_position: If set, the edge above `parent_or_edge` is split at this distance
+                from `parent_or_edge` and the taxon is attached there. Otherwise, the taxon is
+                attached directly to `parent_or_edge` (which must be an internal node).
+
+        Returns:
+            The index of the new leaf node.
+        """
+        if isinstance(parent_or_edge, str):
+            parent_or_edge = self._rs.get_taxon_node_id(taxon=parent_or_edge)
+        return self._rs.insert_leaf(node_id=parent_or_edge, taxon=taxon, length=length,
+                                    position=pendant_position)
+
+    def prune_leaf(self, taxon: str):
+        """Remove a taxon from the tree, removing its row and column from the distance matrix
+        (if computed) without re-computing it, this moves O(n^2) values in memory.
+        Note that node indexes may change.
+
+        Args:
+            taxon: The taxon to remove, this must be a leaf (not a labelled internal node).
+        """
+        return self._rs.prune_leaf(taxon=taxon)
+
     def update_edge_lengths(self, child_nodes: np.ndarray, new_edge_lengths: np.ndarray):
         return self._rs.update_edge_lengths(child_nodes=child_nodes, lengths=new_edge_lengths)
     
@@ -95,8 +135,148 @@ class PhyloDM:
         """
         return self._rs.dm(norm=norm)
 
+    def dm_tile(self, row_range: Tuple[int, int], col_range: Tuple[int, int],
+                norm: Optional[bool] = False) -> np.ndarray:
+        """Returns a rectangular tile of the distance matrix, computed directly from the tree.
+
+        Args:
+            row_range: The (start, end) row indices of the tile, end is exclusive.
+            col_range: The (start, end) column indices of the tile, end is exclusive.
+            norm: If True, the matrix is normalized by branch length.
+        """
+        return self._rs.dm_tile(row_start=row_range[0], row_end=row_range[1],
+                                col_start=col_range[0], col_end=col_range[1], norm=norm)
+
+    def tile_plan(self, n_workers: int, max_tile_size: int = DEFAULT_MAX_TILE_SIZE
+                  ) -> List[List[Tuple[Tuple[int, int], Tuple[int, int]]]]:
+        """Returns the tiles that each worker should compute, covering the upper triangle of the matrix.
+        Each worker is given several tiles, balanced by the number of cells.
+
+        Args:
+            n_workers: The number of independent workers (e.g. the size of a Slurm array).
+            max_tile_size: The maximum number of rows/columns in a tile, each tile is held in
+                memory (8 * max_tile_size ** 2 bytes) while it is computed.
+
+        Returns:
+            For each worker, a list of (row_range, col_range) tiles.
+        """
+        return self._rs.tile_plan(n_workers=n_workers, max_tile_size=max_tile_size)
+
+    def write_tiles(self, directory: str, worker_id: int, n_workers: int,
+                    norm: Optional[bool] = False, max_tile_size: int = DEFAULT_MAX_TILE_SIZE) -> List[str]:
+        """Compute and write the tiles assigned to a worker, each as its own `.npy` file.
+        Tiles are computed and written one at a time, alongside a manifest of the full plan.
+
+        Args:
+            directory: The directory to write the tiles to.
+            worker_id: The index of this worker (e.g. the Slurm array task id).
+            n_workers: The total number of workers.
+            norm: If True, the matrix is normalized by branch length.
+            max_tile_size: The maximum number of rows/columns in a tile.
+
+        Returns:
+            The paths to each of the tiles written.
+        """
+        if not 0 <= worker_id < n_workers:
+            raise ValueError(f'Worker id {worker_id} is out of range for {n_workers} workers.')
+        os.makedirs(directory, exist_ok=True)
+        plan = self.tile_plan(n_workers, max_tile_size)
+
+        # Every worker writes the same manifest, a different one means the plans were mixed.
+        manifest = {'n_taxa': len(self.taxa()),
+                    'tiles': sorted([r[0], r[1], c[0], c[1]] for tiles in plan for r, c in tiles)}
+        manifest_path = os.path.join(directory, TILE_MANIFEST)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                if json.load(f) != manifest:
+                    raise ValueError(f'The directory contains tiles from a different plan: {directory}')
+        else:
+            tmp_path = f'{manifest_path}.{worker_id}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, manifest_path)
+
+        out = list()
+        for (row_start, row_end), (col_start, col_end) in plan[worker_id]:
+            tile = self.dm_tile((row_start, row_end), (col_start, col_end), norm=norm)
+            path = os.path.join(directory, f'tile_{row_start}_{row_end}_{col_start}_{col_end}.npy')
+            np.save(path, tile)
+            del tile
+            out.append(path)
+        return out
+
+    @staticmethod
+    def assemble_tiles(directory: str, path: str) -> np.memmap:
+        """Stitch the tiles written by `write_tiles` into a symmetrical distance matrix.
+
+        Args:
+            directory: The directory containing the tiles.
+            path: The path to write the `.npy` matrix to, this is memory mapped.
+
+        Returns:
+            The memory mapped distance matrix.
+
+        Raises:
+            ValueError: If any tile in the manifest is missing, or any other tile is present.
+        """
+        manifest_path = os.path.join(directory, TILE_MANIFEST)
+        if not os.path.isfile(manifest_path):
+            raise ValueError(f'No tile manifest was found in: {directory}')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        n_taxa = manifest['n_taxa']
+        expected = set(tuple(x) for x in manifest['tiles'])
+
+        found = set()
+        for file_name in os.listdir(directory):
+            hit = TILE_FILE_RE.match(file_name)
+            if hit:
+                found.add(tuple(int(x) for x in hit.groups()))
+        missing = expected - found
+        if missing:
+            raise ValueError(f'{len(missing)} tile(s) are missing from {directory}, e.g. {min(missing)}')
+        unexpected = found - expected
+        if unexpected:
+            raise ValueError(f'{len(unexpected)} tile(s) in {directory} are not in the manifest, '
+                             f'e.g. {min(unexpected)}')
+
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(n_taxa, n_taxa))
+        for row_start, row_end, col_start, col_end in sorted(expected):
+            tile_path = os.path.join(directory, f'tile_{row_start}_{row_end}_{col_start}_{col_end}.npy')
+            tile = np.load(tile_path, mmap_mode='r')
+            if tile.shape != (row_end - row_start, col_end - col_start):
+                raise ValueError(f'The tile has an unexpected shape {tile.shape}: {tile_path}')
+            out[row_start:row_end, col_start:col_end] = tile
+            out[col_start:col_end, row_start:row_end] = tile.T
+        out.flush()
+        return out
+
+    def diversity(self, community_matrix: np.ndarray, metrics: Sequence[str] = ('pd', 'mpd', 'mntd'),
+                  abundance_weighted: bool = False, n_threads: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Compute phylogenetic diversity metrics for each community, directly from the tree.
+
+        Args:
+            community_matrix: A (samples x taxa) presence or abundance array, columns are ordered as
+                `taxa()` (i.e. sorted by taxon).
+            metrics: The metrics to compute: 'pd' (Faith's PD), 'mpd', and/or 'mntd'.
+            abundance_weighted: If True, MPD and MNTD are weighted by abundance (as in picante).
+            n_threads: The number of threads to use, defaults to all CPUs.
+
+        Returns:
+            A mapping of each metric to an array with one value per sample.
+            MPD and MNTD are NaN for samples with fewer than two taxa.
+        """
+        community_matrix = np.ascontiguousarray(community_matrix, dtype=np.float64)
+        if community_matrix.ndim != 2:
+            raise ValueError('The community matrix must be two dimensional (samples x taxa).')
+        metrics = list(metrics)
+        result = self._rs.diversity(community=community_matrix, metrics=metrics,
+                                    abundance_weighted=abundance_weighted,
+                                    n_threads=n_threads or os.cpu_count() or 1)
+        return {metric: result[:, i] for i, metric in enumerate(metrics)}
+
     def taxa(self) -> List[str]:
-        """Returns a list of all taxa within the tree."""
+        """Returns a list of all taxa within the tree, sorted (i.e. the matrix row/column order)."""
         return self._rs.taxa()
 
     def length(self) -> float:
@@ -0,0 +1,280 @@
+use std::ops::Range;
+use std::thread;
+
+use ndarray::{Array2, ArrayBase, Data, Ix2};
+
+use crate::error::PhyloErr;
+use crate::pdm::PDM;
+use crate::tree::Edge;
+
+/// A phylogenetic diversity metric computed for each community (sample).
+#[derive(Debug, Clone, Copy, Eq, PartialEq)]
+pub enum Metric {
+    /// Faith's phylogenetic diversity, the sum of branches connecting the taxa to the root.
+    Pd,
+    /// Mean pairwise distance between taxa.
+    Mpd,
+    /// Mean nearest taxon distance.
+    Mntd,
+}
+
+impl Metric {
+    /// Return the metric corresponding to a (case insensitive) name.
+    ///
+    /// # Examples
+    ///
+    /// ```
+    /// use phylodm::diversity::Metric;
+    /// assert_eq!(Metric::from_name("MPD").unwrap(), Metric::Mpd);
+    /// ```
+    pub fn from_name(name: &str) -> Result<Self, PhyloErr> {
+        match name.to_lowercase().as_str() {
+            "pd" => Ok(Self::Pd),
+            "mpd" => Ok(Self::Mpd),
+            "mntd" => Ok(Self::Mntd),
+            _ => Err(PhyloErr(format!("Unknown diversity metric: '{name}'"))),
+        }
+    }
+}
+
+/// The tree flattened into preorder, i.e. a parent always precedes its children.
+struct Layout {
+    /// The preorder index of the parent of each node (the root is first and has none).
+    parent: Vec<usize>,
+    /// The length of the edge to the parent of each node.
+    edge: Vec<f64>,
+    /// The community matrix column of each leaf node.
+    col: Vec<Option<usize>>,
+    /// The preorder index of the leaf node for each community matrix column.
+    leaf: Vec<usize>,
+}
+
+/// Buffers re-used between communities, one value per node.
+struct Buffers {
+    /// The nodes in the subtree induced by the present taxa, in preorder.
+    nodes: Vec<usize>,
+    /// The community that last visited each node.
+    stamp: Vec<usize>,
+    below: Vec<f64>,
+    down: Vec<f64>,
+    up: Vec<f64>,
+    best: Vec<(f64, usize, f64)>,
+}
+
+impl Buffers {
+    fn new(n_nodes: usize) -> Self {
+        Self {
+            nodes: Vec::with_capacity(n_nodes),
+            stamp: vec![usize::MAX; n_nodes],
+            below: vec![0.0; n_nodes],
+            down: vec![0.0; n_nodes],
+            up: vec![0.0; n_nodes],
+            best: vec![(0.0, 0, 0.0); n_nodes],
+        }
+    }
+}
+
+/// Compute the metrics for a single community.
+///
+/// Only the subtree connecting the present taxa to the root is visited. PD and MPD are found in
+/// one postorder pass, as each edge contributes its length to PD, and `length * below * (total - below)`
+/// to the sum of pairwise distances. MNTD requires a second (preorder) pass to find the nearest
+/// taxon outside each subtree.
+fn community_diversity(layout: &Layout, sample_idx: usize, values: &[f64], metrics: &[Metric], abundance_weighted: bool, buf: &mut Buffers, out: &mut [f64]) {
+    let n_nodes = layout.parent.len();
+    let weight = |value: f64| if abundance_weighted { value } else { 1.0 };
+
+    // Find the subtree by walking from each present taxon towards the root.
+    buf.nodes.clear();
+    let mut total = 0.0;
+    let mut n_present = 0;
+    for (col, &value) in values.iter().enumerate() {
+        if value <= 0.0 {
+            continue;
+        }
+        total += weight(value);
+        n_present += 1;
+        let mut v = layout.leaf[col];
+        while buf.stamp[v] != sample_idx {
+            buf.stamp[v] = sample_idx;
+            buf.nodes.push(v);
+            if v == 0 {
+                break;
+            }
+            v = layout.parent[v];
+        }
+    }
+
+    // Order the subtree, scanning all nodes is faster than sorting if most are present.
+    if buf.nodes.len() * 16 < n_nodes {
+        buf.nodes.sort_unstable();
+    } else {
+        buf.nodes.clear();
+        buf.nodes.extend((0..n_nodes).filter(|&v| buf.stamp[v] == sample_idx));
+    }
+
+    // Postorder: the weight below each node, and the distance to the nearest present leaf below.
+    for &v in &buf.nodes {
+        (buf.below[v], buf.down[v]) = match layout.col[v] {
+            Some(col) if values[col] > 0.0 => (weight(values[col]), 0.0),
+            _ => (0.0, f64::INFINITY),
+        };
+    }
+    let mut pd = 0.0;
+    let mut pairwise = 0.0;
+    for &v in buf.nodes.iter().rev().filter(|&&v| v != 0) {
+        let edge = layout.edge[v];
+        let below = buf.below[v];
+        pd += edge;
+        pairwise += edge * below * (total - below);
+        let p = layout.parent[v];
+        buf.below[p] += below;
+        buf.down[p] = buf.down[p].min(buf.down[v] + edge);
+    }
+
+    // Only communities with two or more taxa have pairwise distances.
+    // As in picante, the weighted MPD includes each taxon compared to itself (at distance zero).
+    let mpd = if n_present < 2 {
+        f64::NAN
+    } else if abundance_weighted {
+        pairwise / (total * total / 2.0)
+    } else {
+        pairwise / ((n_present * (n_present - 1)) as f64 / 2.0)
+    };
+
+    let mntd = if n_present < 2 || !metrics.contains(&Metric::Mntd) {
+        f64::NAN
+    } else {
+        nearest_outside(layout, buf);
+        let mut sum = 0.0;
+        for &v in &buf.nodes {
+            if let Some(col) = layout.col[v] {
+                if values[col] > 0.0 {
+                    sum += weight(values[col]) * buf.up[v];
+                }
+            }
+        }
+        sum / total
+    };
+
+    for (value, metric) in out.iter_mut().zip(metrics) {
+        *value = match metric {
+            Metric::Pd => pd,
+            Metric::Mpd => mpd,
+            Metric::Mntd => mntd,
+        };
+    }
+}
+
+/// Set `up[v]` to the distance from `v` to the nearest present leaf outside the subtree of `v`.
+/// Siblings are compared using the best and second best distance below their shared parent.
+fn nearest_outside(layout: &Layout, buf: &mut Buffers) {
+    for &v in &buf.nodes {
+        buf.best[v] = (f64::INFINITY, usize::MAX, f64::INFINITY);
+    }
+    for &v in buf.nodes.iter().filter(|&&v| v != 0) {
+        let dist = buf.down[v] + layout.edge[v];
+        let best = &mut buf.best[layout.parent[v]];
+        if dist < best.0 {
+            *best = (dist, v, best.0);
+        } else if dist < best.2 {
+            best.2 = dist;
+        }
+    }
+    buf.up[0] = f64::INFINITY;
+    for &v in buf.nodes.iter().filter(|&&v| v != 0) {
+        let p = layout.parent[v];
+        let (first, first_idx, second) = buf.best[p];
+        let sibling = if first_idx == v { second } else { first };
+        buf.up[v] = layout.edge[v] + buf.up[p].min(sibling);
+    }
+}
+
+/// Compute phylogenetic diversity metrics for many communities directly from the tree, without
+/// computing the distance matrix.
+///
+/// # Arguments
+///
+/// * `pdm`: - The tree.
+/// * `community`: - A (samples x taxa) presence or abundance matrix, columns are in sorted taxon order
+///   (i.e. `leaf_nodes` after `order_leaf_node_idx`, which is called here).
+/// * `metrics`: - The metrics to compute.
+/// * `abundance_weighted`: - True if MPD and MNTD should be weighted by abundance, otherwise any
+///   positive value is treated as present.
+/// * `n_threads`: - The number of threads to distribute the communities across.
+///
+/// Returns a (samples x metrics) matrix, MPD and MNTD are NaN for communities with fewer than two taxa.
+///
+/// # Errors
+/// If the community matrix does not match the taxa, contains negative values, or the tree
+/// structure is unexpected, an error will be raised.
+pub fn diversity<S: Data<Elem = f64>>(pdm: &mut PDM, community: &ArrayBase<S, Ix2>, metrics: &[Metric], abundance_weighted: bool, n_threads: usize) -> Result<Array2<f64>, PhyloErr> {
+    let n_taxa = pdm.n_leaf_nodes();
+    if n_taxa == 0 {
+        return Err(PhyloErr("The tree has no taxa!".to_string()));
+    }
+    if community.ncols() != n_taxa {
+        return Err(PhyloErr(format!("The community matrix has {} columns, expected {n_taxa} (one per taxon).", community.ncols())));
+    }
+
+    // For reproducibility, order the taxa
+    pdm.order_leaf_node_idx();
+    let pdm: &PDM = pdm;
+
+    // Flatten the tree into preorder
+    let preorder = pdm.preorder_node_ids()?;
+    let mut position = vec![0; pdm.n_nodes()];
+    for (i, node_id) in preorder.iter().enumerate() {
+        position[node_id.0] = i;
+    }
+    let mut layout = Layout {
+        parent: Vec::with_capacity(preorder.len()),
+        edge: Vec::with_capacity(preorder.len()),
+        col: vec![None; preorder.len()],
+        leaf: vec![0; n_taxa],
+    };
+    for node_id in &preorder {
+        let node = pdm.get_node(*node_id);
+        layout.parent.push(node.parent.map_or(0, |p| position[p.0]));
+        layout.edge.push(node.parent_distance.unwrap_or(Edge(0.0)).0);
+    }
+    for (col, leaf_id) in pdm.row_idx_to_leaf_idx.iter().enumerate() {
+        layout.col[position[leaf_id.0]] = Some(col);
+        layout.leaf[col] = position[leaf_id.0];
+    }
+
+    // Each community is read as a contiguous row
+    if community.iter().any(|value| value.is_nan() || *value < 0.0) {
+        return Err(PhyloErr("The community matrix must not contain negative or NaN values.".to_string()));
+    }
+    let n_samples = community.nrows();
+    let community = community.as_standard_layout();
+    let community = community.as_slice().unwrap();
+
+    // Distribute contiguous chunks of communities across the threads.
+    let n_metrics = metrics.len();
+    let mut values = vec![f64::NAN; n_samples * n_metrics];
+    let samples_per_thread = n_samples.div_ceil(n_threads.max(1)).max(1);
+    thread::scope(|s| {
+        for (chunk_idx, out) in values.chunks_mut(samples_per_thread * n_metrics.max(1)).enumerate() {
+            let samples: Range<usize> = chunk_idx * samples_per_thread..((chunk_idx + 1) * samples_per_thread).min(n_samples);
+            let layout = &layout;
+            s.spawn(move || {
+                let mut buf = Buffers::new(layout.parent.len());
+                for (i, sample_idx) in samples.enumerate() {
+                    community_diversity(
+                        layout,
+                        sample_idx,
+                        &community[sample_idx * n_taxa..(sample_idx + 1) * n_taxa],
+                        metrics,
+                        abundance_weighted,
+                        &mut buf,
+                        &mut out[i * n_metrics..(i + 1) * n_metrics],
+                    );
+                }
+            });
+        }
+    });
+
+    Array2::from_shape_vec((n_samples, n_metrics), values).map_err(|e| PhyloErr(format!("Unable to create the diversity matrix: {e}")))
+}
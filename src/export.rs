@@ -0,0 +1,263 @@
+use std::fs::File;
+use std::io::{BufWriter, Write};
+use std::ops::Range;
+use std::path::Path;
+use std::thread;
+
+use crate::error::PhyloErr;
+use crate::pdm::PDM;
+use crate::tree::NodeId;
+
+/// The approximate number of cells each thread computes before the rows are written.
+const CELLS_PER_THREAD: usize = 1 << 20;
+
+/// The output format of the distance matrix.
+#[derive(Debug, Clone, Copy, Eq, PartialEq)]
+pub enum Format {
+    /// Tab separated, with a header row of taxa and each row prefixed by its taxon.
+    Tsv,
+    /// Square (relaxed) PHYLIP distance matrix.
+    Phylip,
+    /// NumPy `.npy` array of little-endian `f64` values.
+    Npy,
+    /// The upper triangle (excluding the diagonal) as little-endian `f64` values, i.e. the
+    /// condensed form used by SciPy.
+    Condensed,
+}
+
+/// The compression applied to the output file.
+#[derive(Debug, Clone, Copy, Eq, PartialEq)]
+pub enum Codec {
+    None,
+    Gzip,
+    Zstd,
+}
+
+impl Format {
+    /// Determine the output format from a file path, ignoring any compression extension.
+    ///
+    /// # Examples
+    ///
+    /// ```
+    /// use phylodm::export::Format;
+    /// assert_eq!(Format::from_path("out.tsv.gz").unwrap(), Format::Tsv);
+    /// assert_eq!(Format::from_path("out.condensed.bin").unwrap(), Format::Condensed);
+    /// ```
+    pub fn from_path(path: &str) -> Result<Self, PhyloErr> {
+        let path = path.trim_end_matches(".gz").trim_end_matches(".zst");
+        if path.ends_with(".tsv") {
+            Ok(Self::Tsv)
+        } else if path.ends_with(".phylip") || path.ends_with(".phy") {
+            Ok(Self::Phylip)
+        } else if path.ends_with(".npy") {
+            Ok(Self::Npy)
+        } else if path.ends_with(".condensed.bin") {
+            Ok(Self::Condensed)
+        } else {
+            Err(PhyloErr(format!("Unable to determine the output format from the path: '{path}'")))
+        }
+    }
+}
+
+impl Codec {
+    /// Determine the compression from a file path.
+    ///
+    /// # Examples
+    ///
+    /// ```
+    /// use phylodm::export::Codec;
+    /// assert_eq!(Codec::from_path("out.tsv.zst"), Codec::Zstd);
+    /// ```
+    #[must_use]
+    pub fn from_path(path: &str) -> Self {
+        if path.ends_with(".gz") {
+            Self::Gzip
+        } else if path.ends_with(".zst") {
+            Self::Zstd
+        } else {
+            Self::None
+        }
+    }
+
+    /// Return true if the crate was built with support for this compression.
+    #[must_use]
+    pub fn is_available(self) -> bool {
+        match self {
+            Self::None => true,
+            Self::Gzip => cfg!(feature = "flate2"),
+            Self::Zstd => cfg!(feature = "zstd"),
+        }
+    }
+}
+
+/// Return the header of a `.npy` file containing a square `f64` matrix.
+///
+/// # Arguments
+///
+/// * `size`: - The number of rows/columns in the matrix.
+#[must_use]
+pub fn npy_header(size: usize) -> Vec<u8> {
+    let mut dict = format!("{{'descr': '<f8', 'fortran_order': False, 'shape': ({size}, {size}), }}").into_bytes();
+
+    // Magic string (6), version (2), header length (2), then pad to a multiple of 64 bytes.
+    let unpadded = 10 + dict.len() + 1;
+    dict.resize(dict.len() + (64 - unpadded % 64) % 64, b' ');
+    dict.push(b'\n');
+
+    let mut out = b"\x93NUMPY\x01\x00".to_vec();
+    out.extend((dict.len() as u16).to_le_bytes());
+    out.extend(dict);
+    out
+}
+
+/// Append the formatted rows of the matrix to a buffer.
+fn format_rows(format: Format, rows: Range<usize>, values: &[f64], taxa: &[String], out: &mut Vec<u8>) {
+    let n_taxa = taxa.len();
+    for (row_values, row_idx) in values.chunks(n_taxa.max(1)).zip(rows) {
+        match format {
+            Format::Tsv | Format::Phylip => {
+                let sep = if format == Format::Tsv { '\t' } else { ' ' };
+                out.extend(taxa[row_idx].as_bytes());
+                for value in row_values {
+                    write!(out, "{sep}{value}").unwrap();
+                }
+                out.push(b'\n');
+            }
+            Format::Npy => {
+                for value in row_values {
+                    out.extend(value.to_le_bytes());
+                }
+            }
+            Format::Condensed => {
+                for value in &row_values[row_idx + 1..] {
+                    out.extend(value.to_le_bytes());
+                }
+            }
+        }
+    }
+}
+
+/// Write the distance matrix to a writer, each row is computed directly from the tree so that
+/// the full matrix is never held in memory.
+///
+/// # Arguments
+///
+/// * `pdm`: - The tree to write.
+/// * `writer`: - The destination of the matrix.
+/// * `format`: - The output format.
+/// * `norm`: - True if the result should be normalized by the sum of all branches in the tree.
+/// * `n_threads`: - The number of threads used to compute and format rows.
+///
+/// # Errors
+/// If any errors are encountered writing, or due to unexpected tree structures, an error will be raised.
+pub fn write_matrix<W: Write>(pdm: &mut PDM, writer: &mut W, format: Format, norm: bool, n_threads: usize) -> Result<(), PhyloErr> {
+    let io_err = |e: std::io::Error| PhyloErr(format!("Unable to write the distance matrix: {e}"));
+    if pdm.n_leaf_nodes() == 0 {
+        return Err(PhyloErr("The tree has no taxa!".to_string()));
+    }
+
+    pdm.order_leaf_node_idx();
+    let pdm: &PDM = pdm;
+    let taxa: Vec<String> = pdm.leaf_nodes()?.into_iter().map(|t| t.0).collect();
+    let preorder: Vec<NodeId> = pdm.preorder_node_ids()?;
+    let n_taxa = taxa.len();
+
+    // Write the header
+    match format {
+        Format::Tsv => {
+            for taxon in &taxa {
+                write!(writer, "\t{taxon}").map_err(io_err)?;
+            }
+            writeln!(writer).map_err(io_err)?;
+        }
+        Format::Phylip => writeln!(writer, "{n_taxa}").map_err(io_err)?,
+        Format::Npy => writer.write_all(&npy_header(n_taxa)).map_err(io_err)?,
+        Format::Condensed => {}
+    }
+
+    // Each thread computes and formats a contiguous chunk of rows, these are written in order.
+    let n_threads = n_threads.max(1);
+    let rows_per_thread = (CELLS_PER_THREAD / n_taxa.max(1)).max(1);
+    let mut row_start = 0;
+    while row_start < n_taxa {
+        let chunks: Vec<Range<usize>> = (0..n_threads)
+            .map(|i| (row_start + i * rows_per_thread).min(n_taxa)..(row_start + (i + 1) * rows_per_thread).min(n_taxa))
+            .filter(|rows| !rows.is_empty())
+            .collect();
+        row_start = chunks.last().map_or(n_taxa, |rows| rows.end);
+
+        let buffers: Vec<Vec<u8>> = thread::scope(|s| {
+            let handles: Vec<_> = chunks
+                .into_iter()
+                .map(|rows| {
+                    let (taxa, preorder) = (&taxa, &preorder);
+                    s.spawn(move || {
+                        let mut values = vec![0.0; rows.len() * n_taxa];
+                        pdm.fill_tile(rows.clone(), 0..n_taxa, norm, preorder, &mut values);
+                        let mut out = Vec::new();
+                        format_rows(format, rows, &values, taxa, &mut out);
+                        out
+                    })
+                })
+                .collect();
+            handles.into_iter().map(|h| h.join().unwrap()).collect()
+        });
+        for buffer in buffers {
+            writer.write_all(&buffer).map_err(io_err)?;
+        }
+    }
+    Ok(())
+}
+
+/// Write the distance matrix to a file, the format and compression are determined by the extension
+/// (e.g. `.tsv`, `.phylip`, `.npy`, `.condensed.bin`, optionally followed by `.gz` or `.zst`).
+///
+/// # Errors
+/// If the format is unknown, compression is unavailable, or writing fails, an error will be raised.
+pub fn write_matrix_to_path(pdm: &mut PDM, path: &str, norm: bool, n_threads: usize) -> Result<(), PhyloErr> {
+    let format = Format::from_path(path)?;
+    let codec = Codec::from_path(path);
+    if !codec.is_available() {
+        return Err(PhyloErr(format!("{codec:?} compression is not available, enable the `compression` feature.")));
+    }
+    let io_err = |e: std::io::Error| PhyloErr(format!("Unable to write to '{path}': {e}"));
+    let file = BufWriter::new(File::create(Path::new(path)).map_err(io_err)?);
+
+    match codec {
+        Codec::None => {
+            let mut writer = file;
+            write_matrix(pdm, &mut writer, format, norm, n_threads)?;
+            writer.flush().map_err(io_err)?;
+        }
+        #[cfg(feature = "flate2")]
+        Codec::Gzip => {
+            let mut writer = flate2::write::GzEncoder::new(file, flate2::Compression::fast());
+            write_matrix(pdm, &mut writer, format, norm, n_threads)?;
+            writer.finish().map_err(io_err)?.flush().map_err(io_err)?;
+        }
+        #[cfg(feature = "zstd")]
+        Codec::Zstd => {
+            let mut writer = zstd::stream::write::Encoder::new(file, 0).map_err(io_err)?;
+            write_matrix(pdm, &mut writer, format, norm, n_threads)?;
+            writer.finish().map_err(io_err)?.flush().map_err(io_err)?;
+        }
+        #[allow(unreachable_patterns)]
+        _ => unreachable!("The codec availability is checked before the file is created."),
+    }
+    Ok(())
+}
+
+/// Write the taxa to a file, one per line, in the same order as the matrix rows.
+///
+/// # Errors
+/// If writing fails an error will be raised.
+pub fn write_taxa_to_path(pdm: &mut PDM, path: &str) -> Result<(), PhyloErr> {
+    let io_err = |e: std::io::Error| PhyloErr(format!("Unable to write to '{path}': {e}"));
+    pdm.order_leaf_node_idx();
+    let mut writer = BufWriter::new(File::create(Path::new(path)).map_err(io_err)?);
+    for taxon in pdm.leaf_nodes()? {
+        writeln!(writer, "{}", taxon.0).map_err(io_err)?;
+    }
+    writer.flush().map_err(io_err)?;
+    Ok(())
+}
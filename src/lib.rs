@@ -9,3 +9,5 @@ pub mod util;
 
 pub mod tree;
 pub mod error;
+pub mod export;
+pub mod diversity;
@@ -1,12 +1,135 @@
-// use phylodm::PDM;
-
-fn main() {
-    // let mut tree = PDM::default();
-    // tree.load_from_newick_path("/Users/aaron/tmp/500_taxa.tree");
-    // // tree.load_from_newick_path("/Users/aaron/git/PhyloDM/scripts/generate_test_data/test.tree");
-    //
-    // // tree.load_from_newick_path(&"/Users/aaron/git/PhyloDM/src/newick.txt".to_string());
-    // let _arr = tree.matrix(false);
-    //
-    // return;
+use std::process::ExitCode;
+use std::thread;
+
+use phylodm::export::{write_matrix_to_path, write_taxa_to_path};
+use phylodm::PDM;
+
+const USAGE: &str = "\
+Usage: phylodm <TREE> -o <OUTPUT> [--norm] [--threads N] [--taxa <PATH>]
+
+Write the pairwise distance matrix of a Newick tree.
+
+The output format is determined by the extension of OUTPUT:
+  .tsv            Tab separated, with taxa in the first row and column.
+  .phylip         Square PHYLIP distance matrix.
+  .npy            NumPy array.
+  .condensed.bin  Upper triangle (excluding the diagonal) as little-endian f64.
+Append .gz or .zst to compress the output (requires the `compression` feature).
+
+Options:
+  -o, --output <OUTPUT>  The path to write the matrix to.
+  --norm                 Normalise the distances by the sum of all branches.
+  -t, --threads <N>      The number of threads to use (default: all).
+  --taxa <PATH>          Write the taxa (in matrix order) to this path, one per line.
+  -h, --help             Print this message.";
+
+/// The command-line arguments.
+struct Args {
+    tree: String,
+    output: String,
+    norm: bool,
+    threads: usize,
+    taxa: Option<String>,
+}
+
+/// Parse the command-line arguments, returns None if the help message was requested.
+fn parse_args(mut args: impl Iterator<Item = String>) -> Result<Option<Args>, String> {
+    let mut tree = None;
+    let mut output = None;
+    let mut norm = false;
+    let mut threads = thread::available_parallelism().map_or(1, |n| n.get());
+    let mut taxa = None;
+
+    while let Some(arg) = args.next() {
+        match arg.as_str() {
+            "-h" | "--help" => return Ok(None),
+            "-o" | "--output" => output = Some(args.next().ok_or("Missing value for --output")?),
+            "--norm" => norm = true,
+            "-t" | "--threads" => {
+                let value = args.next().ok_or("Missing value for --threads")?;
+                threads = value.parse().map_err(|_| format!("Invalid number of threads: '{value}'"))?;
+            }
+            "--taxa" => taxa = Some(args.next().ok_or("Missing value for --taxa")?),
+            _ if arg.starts_with('-') => return Err(format!("Unknown argument: '{arg}'")),
+            _ if tree.is_none() => tree = Some(arg),
+            _ => return Err(format!("Unexpected argument: '{arg}'")),
+        }
+    }
+
+    Ok(Some(Args {
+        tree: tree.ok_or("Missing the path to the tree")?,
+        output: output.ok_or("Missing the output path (-o)")?,
+        norm,
+        threads,
+        taxa,
+    }))
+}
+
+fn main() -> ExitCode {
+    let args = match parse_args(std::env::args().skip(1)) {
+        Ok(Some(args)) => args,
+        Ok(None) => {
+            println!("{USAGE}");
+            return ExitCode::SUCCESS;
+        }
+        Err(e) => {
+            eprintln!("{e}\n\n{USAGE}");
+            return ExitCode::FAILURE;
+        }
+    };
+
+    // The row vector is not needed, rows are computed directly from the tree.
+    let mut tree = PDM::default();
+    let mut result = tree.read_newick_path(&args.tree);
+    if result.is_ok() {
+        result = write_matrix_to_path(&mut tree, &args.output, args.norm, args.threads);
+    }
+    if let (Ok(()), Some(taxa)) = (&result, &args.taxa) {
+        result = write_taxa_to_path(&mut tree, taxa);
+    }
+
+    match result {
+        Ok(()) => ExitCode::SUCCESS,
+        Err(e) => {
+            eprintln!("{e}");
+            ExitCode::FAILURE
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::parse_args;
+
+    fn parse(args: &[&str]) -> Result<Option<super::Args>, String> {
+        parse_args(args.iter().map(|x| (*x).to_string()))
+    }
+
+    #[test]
+    fn test_parse_args() {
+        let args = parse(&["tree.nwk", "-o", "out.tsv", "--norm", "-t", "3", "--taxa", "taxa.txt"]).unwrap().unwrap();
+        assert_eq!(args.tree, "tree.nwk");
+        assert_eq!(args.output, "out.tsv");
+        assert!(args.norm);
+        assert_eq!(args.threads, 3);
+        assert_eq!(args.taxa.as_deref(), Some("taxa.txt"));
+
+        let args = parse(&["--output", "out.npy", "tree.nwk", "--threads", "1"]).unwrap().unwrap();
+        assert_eq!((args.tree.as_str(), args.output.as_str()), ("tree.nwk", "out.npy"));
+        assert!(!args.norm);
+        assert_eq!(args.taxa, None);
+
+        assert!(parse(&["tree.nwk", "-h"]).unwrap().is_none());
+        assert!(parse(&["tree.nwk", "--help", "--unknown"]).unwrap().is_none());
+    }
+
+    #[test]
+    fn test_parse_args_errors() {
+        assert!(parse(&["-o", "out.tsv"]).is_err());
+        assert!(parse(&["tree.nwk"]).is_err());
+        assert!(parse(&["tree.nwk", "-o"]).is_err());
+        assert!(parse(&["tree.nwk", "-o", "out.tsv", "-t", "x"]).is_err());
+        assert!(parse(&["tree.nwk", "-o", "out.tsv", "--unknown"]).is_err());
+        assert!(parse(&["tree.nwk", "other.nwk", "-o", "out.tsv"]).is_err());
+    }
 }
@@ -1,5 +1,7 @@
 use std::collections::HashMap;
+use std::ops::Range;
 use std::panic;
+use std::thread;
 
 use itertools::Itertools;
 use light_phylogeny::ArenaTree as LpTree;
@@ -9,7 +11,7 @@ use ndarray::Array2;
 use crate::error::PhyloErr;
 use crate::tree::{Edge, NodeDepth, NodeId, Taxon};
 use crate::tree::Node;
-use crate::util::{argsort_vec, create_row_vec_from_mat_dims, row_idx_from_mat_coords, row_vec_to_arr_idx, row_vec_to_symmat};
+use crate::util::{argsort_vec, create_row_vec_from_mat_dims, row_idx_from_mat_coords, row_vec_insert_idx, row_vec_remove_idx, row_vec_to_arr_idx, row_vec_to_symmat_norm, tile_plan};
 
 /// Create and manipulate the Phylogenetic Distance Matrix.
 ///
@@ -123,10 +125,14 @@ impl PDM {
 
         // Create the new node, and place it in the tree.
         let node_id = NodeId(self.n_nodes());
+        let row_idx = self.row_idx_to_leaf_idx.len();
         self.taxon_to_node_id.insert(taxon.clone(), node_id);
-        self.leaf_idx_to_row_idx.insert(node_id, self.leaf_idx_to_row_idx.len());
+        self.leaf_idx_to_row_idx.insert(node_id, row_idx);
         self.row_idx_to_leaf_idx.push(node_id);
+        self.leaf_idx_to_row_idx_vec.resize(node_id.0 + 1, 0);
+        self.leaf_idx_to_row_idx_vec[node_id.0] = row_idx;
         self.nodes.push(Node::new(node_id, Some(taxon.clone())));
+        self.row_vec = None;
         return Ok(self.nodes.last().unwrap().id);
     }
 
@@ -134,6 +140,7 @@ impl PDM {
     pub fn add_internal_node(&mut self) -> NodeId {
         let node_id = NodeId(self.n_nodes());
         self.nodes.push(Node::new(node_id, None));
+        self.row_vec = None;
         return self.nodes.last().unwrap().id;
     }
 
@@ -152,6 +159,7 @@ impl PDM {
     }
 
     /// Retrieve a mutable node from the tree.
+    /// Note: Changes made to the node are not reflected in the cached row vector, see `matrix`.
     #[must_use]
     pub fn get_node_mut(&mut self, node_id: NodeId) -> &mut Node {
         &mut self.nodes[node_id.0]
@@ -168,6 +176,258 @@ impl PDM {
     pub fn add_edge(&mut self, parent: NodeId, child: NodeId, length: Edge) {
         self.get_node_mut(parent).add_child(child);
         self.get_node_mut(child).set_parent(parent, length);
+        self.row_vec = None;
+    }
+
+    /// Insert a new taxon into the tree, updating the row vector (if computed) rather than
+    /// re-computing all pairwise distances.
+    ///
+    /// The distances to the new taxon are derived from the row of a leaf below `node_id`, only the
+    /// leaves below `node_id` are visited in the tree. Inserting the row/column still moves O(n^2)
+    /// values within the row vector (see `row_vec_insert_idx`).
+    ///
+    /// # Arguments
+    ///
+    /// * `node_id`: - The node to attach the taxon to, or the node below the edge to split.
+    /// * `taxon`: - The new taxon.
+    /// * `length`: - The length of the pendant edge to the new taxon.
+    /// * `position`: - If set, the edge above `node_id` is split at this distance from `node_id`
+    ///   and the taxon is attached to the new node. Otherwise, it is attached directly to `node_id`.
+    ///
+    /// # Errors
+    /// If the taxon exists, or the node/position is not valid, an error will be raised.
+    pub fn insert_leaf(&mut self, node_id: NodeId, taxon: &Taxon, length: Edge, position: Option<Edge>) -> Result<NodeId, PhyloErr> {
+        if self.taxon_to_node_id.contains_key(taxon) {
+            return Err(PhyloErr(format!("Taxon already exists in the tree: '{taxon:?}'")));
+        }
+        if node_id.0 >= self.n_nodes() {
+            return Err(PhyloErr(format!("Node does not exist: {node_id:?}")));
+        }
+        if !length.0.is_finite() || length.0 < 0.0 {
+            return Err(PhyloErr(format!("The edge length must be finite and non-negative: {}", length.0)));
+        }
+        let node = self.get_node(node_id);
+        let split = match position {
+            Some(position) => {
+                let Some(parent_id) = node.parent else {
+                    return Err(PhyloErr("The root node has no edge to split!".to_string()));
+                };
+                let edge = node.parent_distance.unwrap_or(Edge(0.0));
+                if !(0.0..=edge.0).contains(&position.0) {
+                    return Err(PhyloErr(format!("Position {} is outside the edge of length {}.", position.0, edge.0)));
+                }
+                Some((parent_id, edge, position))
+            }
+            None if node.is_leaf() => {
+                return Err(PhyloErr("Unable to attach a taxon to a leaf node, split its edge instead.".to_string()));
+            }
+            None => None,
+        };
+
+        // Derive the new row (in the current order) before the tree is modified.
+        let new_row = match &self.row_vec {
+            Some(row_vec) => Some(self.attached_leaf_row(node_id, length, position.unwrap_or(Edge(0.0)), row_vec)?),
+            None => None,
+        };
+        let row_vec = self.row_vec.take();
+
+        // Split the edge with a new internal node.
+        let attach_id = match split {
+            Some((parent_id, edge, position)) => {
+                let split_id = self.add_internal_node();
+                for child_id in &mut self.get_node_mut(parent_id).children {
+                    if *child_id == node_id {
+                        *child_id = split_id;
+                    }
+                }
+                self.get_node_mut(split_id).set_parent(parent_id, Edge(edge.0 - position.0));
+                self.get_node_mut(split_id).add_child(node_id);
+                self.get_node_mut(node_id).set_parent(split_id, position);
+                split_id
+            }
+            None => node_id,
+        };
+
+        // Without a row vector the taxon is added as usual, otherwise it is placed in sorted order.
+        let Some(mut row_vec) = row_vec else {
+            let leaf_id = self.add_leaf_node(taxon)?;
+            self.add_edge(attach_id, leaf_id, length);
+            return Ok(leaf_id);
+        };
+        let leaf_id = NodeId(self.n_nodes());
+        self.nodes.push(Node::new(leaf_id, Some(taxon.clone())));
+        self.taxon_to_node_id.insert(taxon.clone(), leaf_id);
+        self.get_node_mut(attach_id).add_child(leaf_id);
+        self.get_node_mut(leaf_id).set_parent(attach_id, length);
+
+        let row_idx = self.row_idx_to_leaf_idx.partition_point(|id| self.get_node(*id).taxon.as_ref() < Some(taxon));
+        self.row_idx_to_leaf_idx.insert(row_idx, leaf_id);
+        self.leaf_idx_to_row_idx_vec.resize(self.n_nodes(), 0);
+        self.update_leaf_row_idx_from(row_idx);
+
+        let mut new_row = new_row.unwrap();
+        new_row.insert(row_idx, 0.0);
+        row_vec_insert_idx(&mut row_vec, row_idx, &new_row);
+        self.row_vec = Some(row_vec);
+        Ok(leaf_id)
+    }
+
+    /// Return the distance from a taxon attached below the edge to `node_id` to every row.
+    ///
+    /// Taxa outside the subtree of `node_id` are at a fixed offset from any taxon inside it, so
+    /// their distances are taken from the row of a descendant taxon. Taxa inside the subtree are
+    /// found by traversing it.
+    ///
+    /// # Errors
+    /// If there is no taxon below `node_id`, an error will be raised.
+    fn attached_leaf_row(&self, node_id: NodeId, length: Edge, position: Edge, row_vec: &[f64]) -> Result<Vec<f64>, PhyloErr> {
+        // Find a descendant taxon, and the distance to it.
+        let mut leaf_id = node_id;
+        let mut leaf_dist = 0.0;
+        while !self.leaf_idx_to_row_idx.contains_key(&leaf_id) {
+            let Some(&child_id) = self.get_node(leaf_id).children.first() else {
+                return Err(PhyloErr(format!("Node {leaf_id:?} has no children and is not a taxon.")));
+            };
+            leaf_dist += self.get_node(child_id).parent_distance.unwrap_or(Edge(0.0)).0;
+            leaf_id = child_id;
+        }
+        let offset = length.0 - leaf_dist - position.0;
+        let mut out = row_vec_to_arr_idx(self.leaf_idx_to_row_idx[&leaf_id], row_vec);
+        for dist in &mut out {
+            *dist += offset;
+        }
+
+        // Replace the distances to taxa below the node.
+        let mut stack = vec![(node_id, length.0 + position.0)];
+        while let Some((cur_id, dist)) = stack.pop() {
+            if let Some(&row_idx) = self.leaf_idx_to_row_idx.get(&cur_id) {
+                out[row_idx] = dist;
+            }
+            for child_id in &self.get_node(cur_id).children {
+                let child_dist = self.get_node(*child_id).parent_distance.unwrap_or(Edge(0.0));
+                stack.push((*child_id, dist + child_dist.0));
+            }
+        }
+        Ok(out)
+    }
+
+    /// Remove a taxon from the tree, updating the row vector (if computed) without re-computing
+    /// all pairwise distances, this moves O(n^2) values within the row vector. If the parent is
+    /// left with a single child it is removed, and its edge is merged into the child's.
+    ///
+    /// Note: Node IDs are re-used, the last node(s) in the tree take the IDs of those removed.
+    ///
+    /// # Arguments
+    ///
+    /// * `taxon`: - The taxon to remove.
+    ///
+    /// # Errors
+    /// If the taxon does not exist, is an internal node, or is the only taxon in the tree, an
+    /// error will be raised.
+    pub fn prune_leaf(&mut self, taxon: &Taxon) -> Result<(), PhyloErr> {
+        let Some(&leaf_id) = self.taxon_to_node_id.get(taxon) else {
+            return Err(PhyloErr(format!("Taxon does not exist in the tree: '{taxon:?}'")));
+        };
+        if !self.get_node(leaf_id).is_leaf() {
+            return Err(PhyloErr(format!("Unable to remove a taxon with children: '{taxon:?}'")));
+        }
+        if self.n_leaf_nodes() < 2 {
+            return Err(PhyloErr("Unable to remove the only taxon in the tree!".to_string()));
+        }
+        let Some(mut parent_id) = self.get_node(leaf_id).parent else {
+            return Err(PhyloErr("Unable to remove the root node!".to_string()));
+        };
+
+        // Detach the leaf, and any ancestors that no longer have children.
+        let mut removed = vec![leaf_id];
+        self.get_node_mut(parent_id).children.retain(|id| *id != leaf_id);
+        while self.get_node(parent_id).is_leaf() {
+            let Some(grandparent_id) = self.get_node(parent_id).parent else { break };
+            self.get_node_mut(grandparent_id).children.retain(|id| *id != parent_id);
+            removed.push(parent_id);
+            parent_id = grandparent_id;
+        }
+
+        // Collapse a parent with only one remaining child.
+        let parent = self.get_node(parent_id);
+        if parent.children.len() == 1 {
+            let child_id = parent.children[0];
+            let child_length = self.get_node(child_id).parent_distance.unwrap_or(Edge(0.0));
+            match (parent.parent, parent.parent_distance) {
+                (Some(grandparent_id), parent_length) => {
+                    for id in &mut self.get_node_mut(grandparent_id).children {
+                        if *id == parent_id {
+                            *id = child_id;
+                        }
+                    }
+                    let length = child_length + parent_length.unwrap_or(Edge(0.0));
+                    self.get_node_mut(child_id).set_parent(grandparent_id, length);
+                }
+                (None, _) => {
+                    let child = self.get_node_mut(child_id);
+                    child.parent = None;
+                    child.parent_distance = None;
+                }
+            }
+            removed.push(parent_id);
+        }
+
+        // Remove the row/column for this taxon.
+        let row_idx = self.get_row_vec_idx_from_leaf_idx(leaf_id);
+        self.taxon_to_node_id.remove(taxon);
+        self.leaf_idx_to_row_idx.remove(&leaf_id);
+        self.row_idx_to_leaf_idx.remove(row_idx);
+        self.update_leaf_row_idx_from(row_idx);
+        if let Some(row_vec) = self.row_vec.as_mut() {
+            row_vec_remove_idx(row_vec, row_idx);
+        }
+
+        // Remove the nodes from the arena, starting with the highest ID so the others are unaffected.
+        removed.sort_unstable();
+        for node_id in removed.into_iter().rev() {
+            self.swap_remove_node(node_id);
+        }
+        Ok(())
+    }
+
+    /// Update the mapping of leaf node to row index, for all rows from `row_idx` onwards.
+    fn update_leaf_row_idx_from(&mut self, row_idx: usize) {
+        for (idx, leaf_id) in self.row_idx_to_leaf_idx.iter().enumerate().skip(row_idx) {
+            self.leaf_idx_to_row_idx.insert(*leaf_id, idx);
+            self.leaf_idx_to_row_idx_vec[leaf_id.0] = idx;
+        }
+    }
+
+    /// Remove a detached node from the arena, the last node is moved into its place.
+    fn swap_remove_node(&mut self, node_id: NodeId) {
+        let last_id = NodeId(self.n_nodes() - 1);
+        self.nodes.swap_remove(node_id.0);
+        if node_id == last_id {
+            return;
+        }
+
+        // Update all references to the node that was moved.
+        self.get_node_mut(node_id).id = node_id;
+        let node = self.get_node(node_id);
+        let (parent, children, taxon) = (node.parent, node.children.clone(), node.taxon.clone());
+        if let Some(parent_id) = parent {
+            for id in &mut self.get_node_mut(parent_id).children {
+                if *id == last_id {
+                    *id = node_id;
+                }
+            }
+        }
+        for child_id in children {
+            self.get_node_mut(child_id).parent = Some(node_id);
+        }
+        if let Some(taxon) = taxon {
+            self.taxon_to_node_id.insert(taxon, node_id);
+            if let Some(row_idx) = self.leaf_idx_to_row_idx.remove(&last_id) {
+                self.leaf_idx_to_row_idx.insert(node_id, row_idx);
+                self.row_idx_to_leaf_idx[row_idx] = node_id;
+                self.leaf_idx_to_row_idx_vec[node_id.0] = row_idx;
+            }
+        }
     }
 
     /// Update edge lengths of a tree
@@ -437,21 +697,178 @@ impl PDM {
 
     /// Return the symmetrical pairwise distance matrix.
     ///
+    /// The row vector is cached, it is only computed if it does not exist. Methods that modify the
+    /// tree (e.g. `add_edge`, `insert_leaf`, `update_edge_lengths`) keep it up to date. If `nodes` are
+    /// modified directly (e.g. via `get_node_mut`), call `compute_row_vec` before calling this.
+    ///
     /// # Arguments
     /// * `norm` - True if the result should be normalized by the sum of all branches in the tree.
     ///
     /// # Errors
     /// If any errors are encountered due to unexpected tree structures, an error will be raised.
     pub fn matrix(&mut self, norm: bool) -> Result<(Vec<Taxon>, Array2<f64>), PhyloErr> {
-        self.compute_row_vec()?;
+        if self.row_vec.is_none() {
+            self.compute_row_vec()?;
+        }
+
+        // Normalisation is applied while the row vector is expanded
+        let denom = if norm { self.length().0 } else { 1.0 };
+        let n_threads = thread::available_parallelism().map_or(1, |n| n.get());
+        let array = row_vec_to_symmat_norm(self.row_vec.as_ref().unwrap(), denom, n_threads);
+        Ok((self.leaf_nodes()?, array))
+    }
+
+    /// Return a rectangular tile of the symmetrical pairwise distance matrix.
+    ///
+    /// Rows and columns follow the same (sorted) taxon order as `matrix`. Each row is computed
+    /// directly from the tree, so only O(nodes + tile) memory is used and the row vector is
+    /// never required.
+    ///
+    /// Each row walks from its taxon to the root, then down to the columns of the tile. The time
+    /// taken is O(rows * (depth + spanning nodes)), where the spanning nodes are the column taxa
+    /// and their ancestors, rather than O(rows * nodes).
+    ///
+    /// # Arguments
+    /// * `rows` - The row indices of the tile.
+    /// * `cols` - The column indices of the tile.
+    /// * `norm` - True if the result should be normalized by the sum of all branches in the tree.
+    ///
+    /// # Errors
+    /// If the tile is out of bounds, or the tree structure is unexpected, an error will be raised.
+    pub fn matrix_tile(&mut self, rows: Range<usize>, cols: Range<usize>, norm: bool) -> Result<Array2<f64>, PhyloErr> {
+        let n_taxa = self.n_leaf_nodes();
+        if n_taxa == 0 {
+            return Err(PhyloErr("The tree has no taxa!".to_string()));
+        }
+        if rows.start > rows.end || rows.end > n_taxa || cols.start > cols.end || cols.end > n_taxa {
+            return Err(PhyloErr(format!("Tile is out of bounds for a matrix of {n_taxa} taxa.")));
+        }
+
+        // For reproducibility, order the taxa
+        self.order_leaf_node_idx();
+
+        let preorder = self.preorder_node_ids()?;
+        let mut array = Array2::<f64>::zeros([rows.len(), cols.len()]);
+        self.fill_tile(rows, cols, norm, &preorder, array.as_slice_mut().unwrap());
+        Ok(array)
+    }
 
-        let mut array = row_vec_to_symmat(self.row_vec.as_ref().unwrap());
+    /// Write a tile of the distance matrix into a row-major buffer.
+    /// Unlike `matrix_tile`, this does not re-order the taxa so it can be shared between threads.
+    ///
+    /// # Arguments
+    /// * `rows` - The row indices of the tile.
+    /// * `cols` - The column indices of the tile.
+    /// * `norm` - True if the result should be normalized by the sum of all branches in the tree.
+    /// * `preorder`: - The output of `preorder_node_ids`.
+    /// * `out`: - The buffer to write to, must be of length `rows.len() * cols.len()`.
+    pub fn fill_tile(&self, rows: Range<usize>, cols: Range<usize>, norm: bool, preorder: &[NodeId], out: &mut [f64]) {
+        // Buffers are re-used for each row in the tile
+        let mut dist = vec![0.0; self.n_nodes()];
+        let mut on_path = vec![false; self.n_nodes()];
+
+        // Only the nodes spanning the columns (the column taxa and their ancestors) are needed.
+        let spanning;
+        let preorder = if cols.len() == self.n_leaf_nodes() {
+            preorder
+        } else {
+            let mut needed = vec![false; self.n_nodes()];
+            for col_idx in cols.clone() {
+                let mut cur_id = Some(self.row_idx_to_leaf_idx[col_idx]);
+                while let Some(id) = cur_id.filter(|id| !needed[id.0]) {
+                    needed[id.0] = true;
+                    cur_id = self.get_node(id).parent;
+                }
+            }
+            spanning = preorder.iter().copied().filter(|id| needed[id.0]).collect::<Vec<_>>();
+            &spanning
+        };
 
-        if norm {
-            let tree_length = self.length();
-            array.mapv_inplace(|x| x / tree_length.0);
+        let denom = if norm { self.length().0 } else { 1.0 };
+        let n_cols = cols.len();
+        for (i, row_idx) in rows.enumerate() {
+            let leaf_id = self.row_idx_to_leaf_idx[row_idx];
+            self.distances_from_node(leaf_id, preorder, &mut dist, &mut on_path);
+            let out_row = &mut out[i * n_cols..(i + 1) * n_cols];
+            for (cell, col_idx) in out_row.iter_mut().zip(cols.clone()) {
+                *cell = dist[self.row_idx_to_leaf_idx[col_idx].0] / denom;
+            }
+        }
+    }
+
+    /// Return the tiles that each worker should compute to cover the distance matrix.
+    /// Only the upper triangle is planned, the lower triangle is its transpose.
+    ///
+    /// Every worker reads the whole tree, and each row of a tile visits the nodes spanning the
+    /// tile's columns (see `matrix_tile`). As columns are in taxon order rather than tree order,
+    /// these can be a large fraction of the tree, so adding workers gives less than a linear speedup.
+    ///
+    /// # Arguments
+    /// * `n_workers` - The number of independent workers.
+    /// * `max_tile_size` - The maximum number of rows/columns in a tile, each tile is held in
+    ///   memory (`8 * max_tile_size^2` bytes) while it is computed.
+    ///
+    /// # Errors
+    /// If the number of workers or the maximum tile size is zero, an error will be raised.
+    pub fn tile_plan(&self, n_workers: usize, max_tile_size: usize) -> Result<Vec<Vec<(Range<usize>, Range<usize>)>>, PhyloErr> {
+        if n_workers == 0 {
+            return Err(PhyloErr("At least one worker is required!".to_string()));
+        }
+        if max_tile_size == 0 {
+            return Err(PhyloErr("The maximum tile size must be at least one!".to_string()));
+        }
+        Ok(tile_plan(self.n_leaf_nodes(), n_workers, max_tile_size))
+    }
+
+    /// Return all node IDs reachable from the root, parents are ordered before their children.
+    pub fn preorder_node_ids(&self) -> Result<Vec<NodeId>, PhyloErr> {
+        let root = self.root_node()?;
+        let mut out = Vec::with_capacity(self.n_nodes());
+        let mut stack = vec![root];
+        while let Some(node_id) = stack.pop() {
+            out.push(node_id);
+            stack.extend(self.get_node(node_id).children.iter().rev());
+        }
+        Ok(out)
+    }
+
+    /// Set `dist` to the distance between `node_id` and every other node in `preorder`.
+    ///
+    /// # Arguments
+    /// * `node_id`: - The node to measure from.
+    /// * `preorder`: - The output of `preorder_node_ids`, or a subset of it that includes the parent
+    ///   of each node (other than the root). Distances to other nodes are not updated.
+    /// * `dist`: - Buffer indexed by `NodeId`, overwritten with the distances.
+    /// * `on_path`: - Buffer indexed by `NodeId`, must be all false (it is reset before returning).
+    pub fn distances_from_node(&self, node_id: NodeId, preorder: &[NodeId], dist: &mut [f64], on_path: &mut [bool]) {
+        // Walk up to the root, accumulating the distance to each ancestor.
+        dist[node_id.0] = 0.0;
+        on_path[node_id.0] = true;
+        let mut cur_id = node_id;
+        while let Some(parent_id) = self.get_node(cur_id).parent {
+            let length = self.get_node(cur_id).parent_distance.unwrap_or(Edge(0.0));
+            dist[parent_id.0] = dist[cur_id.0] + length.0;
+            on_path[parent_id.0] = true;
+            cur_id = parent_id;
+        }
+
+        // Walk down from the root, every node off the path is reached via its parent.
+        for &cur_id in preorder {
+            if on_path[cur_id.0] {
+                continue;
+            }
+            let node = self.get_node(cur_id);
+            if let Some(parent_id) = node.parent {
+                dist[cur_id.0] = dist[parent_id.0] + node.parent_distance.unwrap_or(Edge(0.0)).0;
+            }
+        }
+
+        // Reset the path for the next call.
+        let mut cur_id = Some(node_id);
+        while let Some(id) = cur_id {
+            on_path[id.0] = false;
+            cur_id = self.get_node(id).parent;
         }
-        Ok((self.leaf_nodes()?, array))
     }
 
     /// Initialise the PDM from a newick file.
@@ -459,6 +876,17 @@ impl PDM {
     /// # Errors
     /// If any errors are encountered due to unexpected tree structures, an error will be raised.
     pub fn load_from_newick_path(&mut self, path: &str) -> Result<(), PhyloErr> {
+        self.read_newick_path(path)?;
+        self.compute_row_vec()?;
+        Ok(())
+    }
+
+    /// Read the nodes and edges from a newick file without computing the row vector.
+    /// This is useful for very large trees where only tiles of the matrix will be computed.
+    ///
+    /// # Errors
+    /// If any errors are encountered due to unexpected tree structures, an error will be raised.
+    pub fn read_newick_path(&mut self, path: &str) -> Result<(), PhyloErr> {
         // Catch any errors that light_phylogeny may throw
         // Suppress the stderr message
         let prev_hook = panic::take_hook();
@@ -492,7 +920,11 @@ impl PDM {
                 );
             }
         }
-        self.compute_row_vec()?;
+
+        // For reproducibility, order the taxa
+        if self.n_leaf_nodes() > 0 {
+            self.order_leaf_node_idx();
+        }
         Ok(())
     }
 
@@ -1,7 +1,8 @@
-use numpy::{PyArray1, PyArray2, PyArrayMethods, ToPyArray};
+use numpy::{PyArray1, PyArray2, PyArrayMethods, PyReadonlyArray2, ToPyArray};
 use pyo3::{Py, pyclass, pymethods, pymodule, PyResult, Python, types::PyModule, Bound};
 use pyo3::exceptions::PyValueError;
 
+use crate::diversity::{diversity, Metric};
 use crate::pdm::PDM as RustPhyloDM;
 use crate::tree::{Edge, NodeId, Taxon};
 
@@ -19,8 +20,13 @@ impl PhyloDM {
         }
     }
 
-    pub fn load_from_newick_path(&mut self, path: &str) -> PyResult<()> {
-        let result = self.tree.load_from_newick_path(path);
+    #[pyo3(signature = (path, compute_row_vec=true))]
+    pub fn load_from_newick_path(&mut self, path: &str, compute_row_vec: bool) -> PyResult<()> {
+        let result = if compute_row_vec {
+            self.tree.load_from_newick_path(path)
+        } else {
+            self.tree.read_newick_path(path)
+        };
         if result.is_err() {
             return Err(PyValueError::new_err("Unable to load newick."));
         }
@@ -46,6 +52,30 @@ impl PhyloDM {
         );
     }
 
+    #[pyo3(signature = (node_id, taxon, length, position=None))]
+    pub fn insert_leaf(&mut self, node_id: usize, taxon: &str, length: f64, position: Option<f64>) -> PyResult<usize> {
+        let result = self.tree.insert_leaf(NodeId(node_id), &Taxon(taxon.to_string()), Edge(length), position.map(Edge));
+        match result {
+            Ok(leaf_id) => Ok(leaf_id.0),
+            Err(e) => Err(PyValueError::new_err(format!("Unable to insert leaf: {}", e.0))),
+        }
+    }
+
+    pub fn prune_leaf(&mut self, taxon: &str) -> PyResult<()> {
+        let result = self.tree.prune_leaf(&Taxon(taxon.to_string()));
+        if let Err(e) = result {
+            return Err(PyValueError::new_err(format!("Unable to prune leaf: {}", e.0)));
+        }
+        Ok(())
+    }
+
+    pub fn get_taxon_node_id(&self, taxon: &str) -> PyResult<usize> {
+        match self.tree.taxon_to_node_id.get(&Taxon(taxon.to_string())) {
+            Some(node_id) => Ok(node_id.0),
+            None => Err(PyValueError::new_err(format!("Taxon does not exist in the tree: '{taxon}'"))),
+        }
+    }
+
     pub fn update_edge_lengths(&mut self, child_nodes: &Bound<'_, PyArray1<usize>>, lengths: &Bound<'_, PyArray1<f64>>) -> PyResult<()> {
         
         let binding = lengths.to_vec().unwrap();
@@ -90,7 +120,52 @@ impl PhyloDM {
         }))
     }
 
-    pub fn taxa(&self) -> PyResult<Vec<String>> {
+    pub fn dm_tile(&mut self, row_start: usize, row_end: usize, col_start: usize, col_end: usize, norm: bool) -> PyResult<Py<PyArray2<f64>>> {
+        let tile = self.tree.matrix_tile(row_start..row_end, col_start..col_end, norm);
+        if tile.is_err() {
+            return Err(PyValueError::new_err("Unable to compute distance matrix tile."));
+        }
+        let array = tile.unwrap();
+        Ok(Python::with_gil(|py| {
+            return Py::from(array.to_pyarray_bound(py));
+        }))
+    }
+
+    pub fn tile_plan(&self, n_workers: usize, max_tile_size: usize) -> PyResult<Vec<Vec<((usize, usize), (usize, usize))>>> {
+        let plan = self.tree.tile_plan(n_workers, max_tile_size);
+        if plan.is_err() {
+            return Err(PyValueError::new_err("Unable to create tile plan."));
+        }
+        let mut out = Vec::with_capacity(n_workers);
+        for tiles in plan.unwrap() {
+            out.push(tiles.into_iter().map(|(rows, cols)| ((rows.start, rows.end), (cols.start, cols.end))).collect());
+        }
+        Ok(out)
+    }
+
+    pub fn diversity(&mut self, community: PyReadonlyArray2<'_, f64>, metrics: Vec<String>, abundance_weighted: bool, n_threads: usize) -> PyResult<Py<PyArray2<f64>>> {
+        let mut parsed_metrics = Vec::with_capacity(metrics.len());
+        for name in &metrics {
+            match Metric::from_name(name) {
+                Ok(metric) => parsed_metrics.push(metric),
+                Err(e) => return Err(PyValueError::new_err(e.0)),
+            }
+        }
+        let result = diversity(&mut self.tree, &community.as_array(), &parsed_metrics, abundance_weighted, n_threads);
+        if let Err(e) = result {
+            return Err(PyValueError::new_err(format!("Unable to compute diversity: {}", e.0)));
+        }
+        let array = result.unwrap();
+        Ok(Python::with_gil(|py| {
+            return Py::from(array.to_pyarray_bound(py));
+        }))
+    }
+
+    pub fn taxa(&mut self) -> PyResult<Vec<String>> {
+        // Return the taxa in the same (sorted) order as the matrix and community columns
+        if self.tree.n_leaf_nodes() > 0 {
+            self.tree.order_leaf_node_idx();
+        }
         let mut out: Vec<String> = Vec::new();
         let taxa = self.tree.leaf_nodes();
         if taxa.is_err() {
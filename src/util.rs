@@ -1,5 +1,17 @@
+use std::ops::Range;
+use std::thread;
+
 use ndarray::Array2;
 
+/// The number of rows in each block when mirroring the upper triangle of a matrix.
+const BLOCK_ROWS: usize = 64;
+
+/// The minimum number of tiles per worker planned by `tile_plan`, so that the work can be balanced.
+const TILES_PER_WORKER: usize = 8;
+
+/// When a row vector grows, space is reserved for this fraction (1/x) of additional rows.
+const ROW_VEC_HEADROOM: usize = 64;
+
 /// Return the row vector index corresponding to the symmetric matrix coordinates (i, j).
 ///
 /// # Arguments
@@ -120,6 +132,33 @@ fn test_mat_size_from_row_vec_size() {
     assert_eq!(mat_size_from_row_vec_size(21), 6);
 }
 
+/// Return the index in the row vector of the first element in a given row of the matrix (i.e. the diagonal).
+///
+/// # Arguments
+///
+/// * `n`: - The number of rows/columns in the matrix.
+/// * `i`: - The row index.
+///
+/// # Examples
+///
+/// ```
+/// use phylodm::util::row_vec_row_offset;
+/// assert_eq!(row_vec_row_offset(3, 1), 3);
+/// ```
+#[must_use]
+pub fn row_vec_row_offset(n: usize, i: usize) -> usize {
+    i * (2 * n + 1 - i) / 2
+}
+
+#[test]
+fn test_row_vec_row_offset() {
+    for n in 1..10 {
+        for i in 0..n {
+            assert_eq!(row_vec_row_offset(n, i), row_idx_from_mat_coords(n, i, i));
+        }
+    }
+}
+
 /// Convert a row vector into a symmetric distance matrix.
 ///
 /// # Arguments
@@ -132,16 +171,92 @@ fn test_mat_size_from_row_vec_size() {
 /// ```
 #[must_use]
 pub fn row_vec_to_symmat(row_vec: &[f64]) -> Array2<f64> {
+    let n_threads = thread::available_parallelism().map_or(1, |n| n.get());
+    row_vec_to_symmat_norm(row_vec, 1.0, n_threads)
+}
+
+/// Convert a row vector into a symmetric distance matrix, dividing each value by `denom`.
+///
+/// Each thread fills a band of rows. The upper triangle of each row is a contiguous copy from the
+/// row vector. The lower triangle is mirrored a block of rows at a time, each row above the block
+/// is read contiguously and written to one column of the block, so the writes stay in cache.
+///
+/// # Arguments
+///
+/// * `row_vec`: - The row vector to convert.
+/// * `denom`: - The value to divide each element by (e.g. the tree length to normalise).
+/// * `n_threads`: - The number of threads to use.
+///
+/// ```
+/// use phylodm::util::row_vec_to_symmat_norm;
+/// let array = row_vec_to_symmat_norm(&vec![0.0, 1.0, 2.0, 3.0, 4.0, 5.0], 2.0, 2);
+/// assert_eq!(array[[2, 1]], 2.0);
+/// ```
+#[must_use]
+pub fn row_vec_to_symmat_norm(row_vec: &[f64], denom: f64, n_threads: usize) -> Array2<f64> {
     let num_leaf = mat_size_from_row_vec_size(row_vec.len());
     let mut array = Array2::<f64>::zeros([num_leaf, num_leaf]);
-    for i in 0..num_leaf {
-        for j in 0..num_leaf {
-            array[[i, j]] = row_vec[row_idx_from_mat_coords(num_leaf, i, j)];
-        }
+    if num_leaf == 0 {
+        return array;
     }
+    let out = array.as_slice_mut().unwrap();
+
+    // Small matrices are not worth the cost of starting threads.
+    let n_threads = if num_leaf < 4 * BLOCK_ROWS { 1 } else { n_threads.max(1) };
+    let rows_per_thread = num_leaf.div_ceil(n_threads);
+    thread::scope(|s| {
+        for (band_idx, band) in out.chunks_mut(rows_per_thread * num_leaf).enumerate() {
+            s.spawn(move || fill_symmat_rows(row_vec, num_leaf, band_idx * rows_per_thread, band, denom));
+        }
+    });
     array
 }
 
+/// Fill a band of rows of the symmetric matrix, starting at `row_start`.
+fn fill_symmat_rows(row_vec: &[f64], n: usize, row_start: usize, out: &mut [f64], denom: f64) {
+    let n_rows = out.len() / n;
+    for block_start in (0..n_rows).step_by(BLOCK_ROWS) {
+        let block_end = (block_start + BLOCK_ROWS).min(n_rows);
+        let (i_start, i_end) = (row_start + block_start, row_start + block_end);
+
+        // The upper triangle (including the diagonal) is contiguous in the row vector.
+        for i in i_start..i_end {
+            let offset = row_vec_row_offset(n, i);
+            let dst = &mut out[(i - row_start) * n + i..(i - row_start + 1) * n];
+            for (x, y) in dst.iter_mut().zip(&row_vec[offset..offset + n - i]) {
+                *x = *y / denom;
+            }
+        }
+
+        // The lower triangle is the transpose of the upper triangle in rows (j) above these rows,
+        // the values for rows i_start..i_end are contiguous in each row j. Each is written to one
+        // column of the block, which stays in cache as only BLOCK_ROWS rows are written.
+        for j in 0..i_end - 1 {
+            let i_first = i_start.max(j + 1);
+            let offset = row_vec_row_offset(n, j);
+            let src = &row_vec[offset + i_first - j..offset + i_end - j];
+            for (k, y) in src.iter().enumerate() {
+                out[(i_first - row_start + k) * n + j] = *y / denom;
+            }
+        }
+    }
+}
+
+#[test]
+fn test_row_vec_to_symmat_norm() {
+    for n in [0, 1, 2, 5, BLOCK_ROWS - 1, BLOCK_ROWS + 1, 4 * BLOCK_ROWS + 3] {
+        let row_vec: Vec<f64> = (0..row_vec_size_from_mat_size(n)).map(|x| x as f64).collect();
+        for n_threads in [1, 3] {
+            let array = row_vec_to_symmat_norm(&row_vec, 3.0, n_threads);
+            for i in 0..n {
+                for j in 0..n {
+                    assert_eq!(array[[i, j]], row_vec[row_idx_from_mat_coords(n, i, j)] / 3.0);
+                }
+            }
+        }
+    }
+}
+
 #[test]
 fn test_row_vec_to_symmat() {
     let row_vec = vec![0.0, 1.0, 2.0, 3.0, 4.0, 5.0];
@@ -172,9 +287,16 @@ fn test_row_vec_to_symmat() {
 pub fn row_vec_to_arr_idx(row_idx: usize, row_vec: &[f64]) -> Vec<f64> {
     let num_leaf = mat_size_from_row_vec_size(row_vec.len());
     let mut out = vec![0.0; num_leaf];
-    for i in 0..num_leaf {
-        out[i] = row_vec[row_idx_from_mat_coords(num_leaf, row_idx, i)];
+
+    // Columns before the diagonal are in the rows above, the offset to each row is accumulated.
+    let mut offset = row_idx;
+    for (i, x) in out[..row_idx].iter_mut().enumerate() {
+        *x = row_vec[offset];
+        offset += num_leaf - i - 1;
     }
+
+    // The remaining columns are contiguous.
+    out[row_idx..].copy_from_slice(&row_vec[offset..offset + num_leaf - row_idx]);
     out
 }
 
@@ -186,6 +308,149 @@ fn test_row_vec_to_arr_idx() {
     assert_eq!(row_vec_to_arr_idx(2, &row_vec), vec![2.0, 4.0, 5.0]);
 }
 
+/// Insert a row/column into a row vector in-place, shifting the existing values.
+///
+/// All values after the first row are moved, i.e. O(n^2). If the capacity is exhausted the
+/// vector is re-allocated (briefly requiring memory for both copies), with space reserved for
+/// 1/64 more rows so that subsequent inserts do not each re-allocate.
+///
+/// # Arguments
+///
+/// * `row_vec`: - The row vector to update.
+/// * `idx`: - The index of the new row/column in the matrix.
+/// * `values`: - The values of the new row/column, one per row of the new matrix.
+///
+/// # Examples
+///
+/// ```
+/// use phylodm::util::row_vec_insert_idx;
+/// let mut row_vec = vec![0.0, 1.0, 0.0];
+/// row_vec_insert_idx(&mut row_vec, 1, &[2.0, 0.0, 3.0]);
+/// assert_eq!(row_vec, vec![0.0, 2.0, 1.0, 0.0, 3.0, 0.0]);
+/// ```
+pub fn row_vec_insert_idx(row_vec: &mut Vec<f64>, idx: usize, values: &[f64]) {
+    let n = mat_size_from_row_vec_size(row_vec.len());
+    let m = n + 1;
+    assert!(idx <= n && values.len() == m, "Invalid row index or number of values.");
+    let size = row_vec_size_from_mat_size(m);
+    if size > row_vec.capacity() {
+        // Reserve exactly, as the default growth would double the capacity.
+        let headroom = row_vec_size_from_mat_size(m + m / ROW_VEC_HEADROOM + 1);
+        row_vec.reserve_exact(headroom - row_vec.len());
+    }
+    row_vec.resize(size, 0.0);
+
+    // Values only move towards the end, so work backwards from the last row.
+    for i in (idx..n).rev() {
+        let old = row_idx_from_mat_coords(n, i, i);
+        row_vec.copy_within(old..old + n - i, row_idx_from_mat_coords(m, i + 1, i + 1));
+    }
+    let new = row_idx_from_mat_coords(m, idx, idx);
+    row_vec[new..new + m - idx].copy_from_slice(&values[idx..]);
+    for i in (0..idx).rev() {
+        let old = row_idx_from_mat_coords(n, i, i);
+        let new = row_idx_from_mat_coords(m, i, i);
+        row_vec.copy_within(old + idx - i..old + n - i, new + idx - i + 1);
+        row_vec[new + idx - i] = values[i];
+        row_vec.copy_within(old..old + idx - i, new);
+    }
+}
+
+#[test]
+fn test_row_vec_insert_idx_capacity() {
+    let n = 200;
+    let mut row_vec = create_row_vec_from_mat_dims(n);
+    row_vec_insert_idx(&mut row_vec, 0, &vec![0.0; n + 1]);
+    let capacity = row_vec.capacity();
+    assert!(capacity >= row_vec_size_from_mat_size(n + 1 + n / ROW_VEC_HEADROOM));
+    assert!(capacity < row_vec_size_from_mat_size(2 * n));
+
+    // The headroom is used before the vector is re-allocated.
+    let ptr = row_vec.as_ptr();
+    for m in n + 1..n + 1 + n / ROW_VEC_HEADROOM {
+        row_vec_insert_idx(&mut row_vec, m / 2, &vec![0.0; m + 1]);
+    }
+    assert_eq!(row_vec.as_ptr(), ptr);
+}
+
+#[test]
+fn test_row_vec_insert_idx() {
+    for n in 0..=6 {
+        for idx in 0..=n {
+            let mut row_vec: Vec<f64> = (0..row_vec_size_from_mat_size(n)).map(|x| x as f64).collect();
+            let values: Vec<f64> = (0..=n).map(|x| -(x as f64)).collect();
+            let expected_mat = row_vec_to_symmat(&row_vec);
+            row_vec_insert_idx(&mut row_vec, idx, &values);
+            let mat = row_vec_to_symmat(&row_vec);
+            for i in 0..=n {
+                for j in 0..=n {
+                    let expected = match (i.cmp(&idx), j.cmp(&idx)) {
+                        (std::cmp::Ordering::Equal, _) => values[j],
+                        (_, std::cmp::Ordering::Equal) => values[i],
+                        _ => expected_mat[[i - usize::from(i > idx), j - usize::from(j > idx)]],
+                    };
+                    assert_eq!(mat[[i, j]], expected);
+                }
+            }
+        }
+    }
+}
+
+/// Remove a row/column from a row vector in-place, shifting the remaining values.
+///
+/// # Arguments
+///
+/// * `row_vec`: - The row vector to update.
+/// * `idx`: - The index of the row/column to remove.
+///
+/// # Examples
+///
+/// ```
+/// use phylodm::util::row_vec_remove_idx;
+/// let mut row_vec = vec![0.0, 2.0, 1.0, 0.0, 3.0, 0.0];
+/// row_vec_remove_idx(&mut row_vec, 1);
+/// assert_eq!(row_vec, vec![0.0, 1.0, 0.0]);
+/// ```
+pub fn row_vec_remove_idx(row_vec: &mut Vec<f64>, idx: usize) {
+    let n = mat_size_from_row_vec_size(row_vec.len());
+    assert!(idx < n, "Invalid row index.");
+    let m = n - 1;
+
+    // Values only move towards the start, so work forwards from the first row.
+    for i in 0..idx {
+        let old = row_idx_from_mat_coords(n, i, i);
+        let new = row_idx_from_mat_coords(m, i, i);
+        row_vec.copy_within(old..old + idx - i, new);
+        row_vec.copy_within(old + idx - i + 1..old + n - i, new + idx - i);
+    }
+    for i in idx + 1..n {
+        let old = row_idx_from_mat_coords(n, i, i);
+        row_vec.copy_within(old..old + n - i, row_idx_from_mat_coords(m, i - 1, i - 1));
+    }
+    row_vec.truncate(row_vec_size_from_mat_size(m));
+}
+
+#[test]
+fn test_row_vec_remove_idx() {
+    for n in 1..=6 {
+        for idx in 0..n {
+            let mut row_vec: Vec<f64> = (0..row_vec_size_from_mat_size(n)).map(|x| x as f64).collect();
+            let expected_mat = row_vec_to_symmat(&row_vec);
+            row_vec_remove_idx(&mut row_vec, idx);
+            assert_eq!(row_vec.len(), row_vec_size_from_mat_size(n - 1));
+            if n > 1 {
+                let mat = row_vec_to_symmat(&row_vec);
+                for i in 0..n - 1 {
+                    for j in 0..n - 1 {
+                        let (a, b) = (i + usize::from(i >= idx), j + usize::from(j >= idx));
+                        assert_eq!(mat[[i, j]], expected_mat[[a, b]]);
+                    }
+                }
+            }
+        }
+    }
+}
+
 /// Sort a vector of f64 values and return the indices that would sort the vector.
 /// No ordering is guaranteed for equal elements.
 ///
@@ -221,3 +486,92 @@ fn test_argsort_vec() {
     let indices = argsort_vec(&arr);
     assert_eq!(indices, vec![0, 2, 1, 3]);
 }
+
+/// Partition the upper triangle of a symmetric matrix into tiles, and assign them to workers.
+/// The plan is deterministic, so independent workers can each compute their own share.
+///
+/// The matrix is split into equal blocks of at most `max_tile_size` rows/columns, and into enough
+/// blocks that there are at least 8 tiles per worker. The largest tiles are assigned
+/// first, each to the worker with the fewest cells so far. Each worker's tiles are in row order.
+///
+/// # Arguments
+///
+/// * `size`: - The number of rows/columns in the matrix.
+/// * `n_workers`: - The number of workers to distribute the tiles across.
+/// * `max_tile_size`: - The maximum number of rows/columns in a tile, this bounds the memory used.
+///
+/// # Examples
+///
+/// ```
+/// use phylodm::util::tile_plan;
+/// let plan = tile_plan(100, 2, 20);
+/// assert_eq!(plan.len(), 2);
+/// assert!(plan.iter().flatten().all(|(rows, cols)| rows.len() <= 20 && cols.len() <= 20));
+/// ```
+#[must_use]
+pub fn tile_plan(size: usize, n_workers: usize, max_tile_size: usize) -> Vec<Vec<(Range<usize>, Range<usize>)>> {
+    let mut plan = vec![Vec::new(); n_workers];
+    if size == 0 || n_workers == 0 {
+        return plan;
+    }
+
+    // Use enough blocks to bound the tile size, and to balance the work between workers.
+    let mut n_blocks = size.div_ceil(max_tile_size.max(1));
+    while n_blocks < size && n_blocks * (n_blocks + 1) / 2 < TILES_PER_WORKER * n_workers {
+        n_blocks += 1;
+    }
+    let bounds: Vec<usize> = (0..=n_blocks).map(|i| i * size / n_blocks).collect();
+    let mut tiles = Vec::with_capacity(n_blocks * (n_blocks + 1) / 2);
+    for i in 0..n_blocks {
+        for j in i..n_blocks {
+            tiles.push((bounds[i]..bounds[i + 1], bounds[j]..bounds[j + 1]));
+        }
+    }
+
+    // Assign the largest tiles first, each to the worker with the fewest cells.
+    tiles.sort_by_key(|(rows, cols)| std::cmp::Reverse(rows.len() * cols.len()));
+    let mut n_cells = vec![0; n_workers];
+    for (rows, cols) in tiles {
+        let worker = (0..n_workers).min_by_key(|&i| n_cells[i]).unwrap();
+        n_cells[worker] += rows.len() * cols.len();
+        plan[worker].push((rows, cols));
+    }
+    for tiles in &mut plan {
+        tiles.sort_by_key(|(rows, cols)| (rows.start, cols.start));
+    }
+    plan
+}
+
+#[test]
+fn test_tile_plan() {
+    for size in 1..=12 {
+        for n_workers in 1..=8 {
+            // Every cell in the upper triangle must be covered exactly once
+            let mut covered = vec![vec![0; size]; size];
+            for (rows, cols) in tile_plan(size, n_workers, 5).into_iter().flatten() {
+                assert!(rows.len() <= 5 && cols.len() <= 5);
+                for i in rows {
+                    for j in cols.clone().filter(|&j| i <= j) {
+                        covered[i][j] += 1;
+                    }
+                }
+            }
+            for i in 0..size {
+                for j in i..size {
+                    assert_eq!(covered[i][j], 1);
+                }
+            }
+        }
+    }
+    assert_eq!(tile_plan(0, 2, 5), vec![vec![], vec![]]);
+
+    // The number of cells computed by each worker is balanced
+    for n_workers in [1, 3, 4, 10, 100] {
+        let cells: Vec<usize> = tile_plan(5000, n_workers, 1000)
+            .iter()
+            .map(|tiles| tiles.iter().map(|(rows, cols)| rows.len() * cols.len()).sum())
+            .collect();
+        let (min, max) = (*cells.iter().min().unwrap(), *cells.iter().max().unwrap());
+        assert!(max as f64 <= 1.25 * min as f64, "{n_workers} workers: {cells:?}");
+    }
+}
@@ -146,6 +146,128 @@ class TestPhyloDM(unittest.TestCase):
         self.assertTrue(test_tree['taxa'] == tuple(pdm.taxa()))
         return
 
+    def test_dm_tile(self):
+        test_tree = get_test_tree(50)
+        pdm = PhyloDM.load_from_dendropy(test_tree['tree'])
+        dm = pdm.dm(norm=False)
+
+        for tiles in pdm.tile_plan(4):
+            for row_range, col_range in tiles:
+                tile = pdm.dm_tile(row_range, col_range, norm=False)
+                expected = dm[row_range[0]:row_range[1], col_range[0]:col_range[1]]
+                self.assertTrue(np.allclose(tile, expected))
+
+    def test_write_and_assemble_tiles(self):
+        test_tree = get_test_tree(50)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp_path = os.path.join(tmpdir, 'test.tree')
+            with open(tmp_path, 'w') as f:
+                f.write(test_tree['tree'].as_string(schema='newick')[5:])
+
+            # Each worker loads the tree independently
+            n_workers = 3
+            tile_dir = os.path.join(tmpdir, 'tiles')
+            for worker_id in range(n_workers):
+                pdm = PhyloDM.load_from_newick_path(tmp_path, compute_row_vec=False)
+                tile_paths = pdm.write_tiles(tile_dir, worker_id, n_workers, norm=True, max_tile_size=7)
+                self.assertGreater(len(tile_paths), 1)
+
+            dm = PhyloDM.assemble_tiles(tile_dir, os.path.join(tmpdir, 'dm.npy'))
+            self.assertTrue(np.allclose(dm, test_tree['pd_mat'] / pdm.length()))
+            self.assertTrue(test_tree['taxa'] == tuple(pdm.taxa()))
+            del dm
+
+            # A tile from a different plan is rejected, both when written and assembled
+            with self.assertRaises(ValueError):
+                pdm.write_tiles(tile_dir, 0, n_workers, norm=True, max_tile_size=8)
+            np.save(os.path.join(tile_dir, 'tile_0_8_0_8.npy'), np.zeros((8, 8)))
+            with self.assertRaises(ValueError):
+                PhyloDM.assemble_tiles(tile_dir, os.path.join(tmpdir, 'dm.npy'))
+
+            # Only the first worker finished, the remaining tiles are missing
+            tile_dir = os.path.join(tmpdir, 'tiles_missing')
+            pdm.write_tiles(tile_dir, 0, n_workers)
+            with self.assertRaises(ValueError):
+                PhyloDM.assemble_tiles(tile_dir, os.path.join(tmpdir, 'dm.npy'))
+
+    def test_diversity(self):
+        test_tree = get_test_tree(30)
+        pdm = PhyloDM.load_from_dendropy(test_tree['tree'])
+        dm = pdm.dm(norm=False)
+
+        rng = np.random.default_rng(42)
+        community = rng.integers(0, 2, size=(20, len(pdm.taxa()))).astype(np.float64)
+        community[0] = 0
+        result = pdm.diversity(community, metrics=['mpd', 'mntd'])
+
+        for i, sample in enumerate(community):
+            idx = np.flatnonzero(sample)
+            if len(idx) < 2:
+                self.assertTrue(np.isnan(result['mpd'][i]))
+                self.assertTrue(np.isnan(result['mntd'][i]))
+                continue
+            sub_dm = dm[np.ix_(idx, idx)]
+            self.assertAlmostEqual(result['mpd'][i], sub_dm[np.triu_indices(len(idx), 1)].mean(), places=6)
+            np.fill_diagonal(sub_dm, np.inf)
+            self.assertAlmostEqual(result['mntd'][i], sub_dm.min(axis=1).mean(), places=6)
+
+    def test_diversity_taxa_order(self):
+        # Build the tree so that the taxa are not added in sorted order
+        pdm = PhyloDM()
+        root = pdm.add_node()
+        for taxon, length in (('C', 3.0), ('A', 1.0), ('B', 2.0)):
+            pdm.add_edge(root, pdm.add_node(taxon=taxon), length=length)
+
+        # The community columns follow taxa(), without computing the matrix first
+        taxa = pdm.taxa()
+        self.assertEqual(taxa, ['A', 'B', 'C'])
+        community = np.array([[float(taxon in ('A', 'C')) for taxon in taxa]])
+        result = pdm.diversity(community, metrics=['pd', 'mpd'])
+        self.assertAlmostEqual(result['pd'][0], 4.0)
+        self.assertAlmostEqual(result['mpd'][0], 4.0)
+
+        # As above, but loaded from a DendroPy tree
+        test_tree = get_test_tree(30)
+        pdm = PhyloDM.load_from_dendropy(test_tree['tree'])
+        taxa = pdm.taxa()
+        self.assertEqual(tuple(taxa), test_tree['taxa'])
+        community = np.zeros((1, len(taxa)))
+        community[0, [0, 3]] = 1
+        result = pdm.diversity(community, metrics=['mpd'])
+        self.assertAlmostEqual(result['mpd'][0], test_tree['pd_mat'][0, 3], places=6)
+
+    def test_insert_and_prune_leaf(self):
+        test_tree = get_test_tree(30)
+        pdm = PhyloDM.load_from_dendropy(test_tree['tree'])
+        dm = pdm.dm(norm=False)
+        taxa = pdm.taxa()
+
+        pdm.insert_leaf(taxa[0], 'new taxon', length=1.5, pendant_position=0.25)
+        new_taxa = pdm.taxa()
+        new_dm = pdm.dm(norm=False)
+        self.assertEqual(new_taxa, sorted(taxa + ['new taxon']))
+        self.assertAlmostEqual(pdm.distance('new taxon', taxa[0]), 1.75)
+
+        # The incremental update must match a full re-computation
+        pdm.compute_row_vec()
+        self.assertTrue(np.allclose(new_dm, pdm.dm(norm=False)))
+
+        pdm.prune_leaf('new taxon')
+        self.assertEqual(pdm.taxa(), taxa)
+        self.assertTrue(np.allclose(dm, pdm.dm(norm=False)))
+
+    def test_prune_leaf_before_dm(self):
+        test_tree = get_test_tree(30)
+        taxa = list(test_tree['taxa'])
+        pdm = PhyloDM.load_from_dendropy(test_tree['tree'])
+        pdm.insert_leaf(taxa[1], 'new taxon', length=1.5, pendant_position=0.25)
+        pdm.prune_leaf('new taxon')
+        pdm.prune_leaf(taxa[0])
+
+        keep = np.arange(1, len(taxa))
+        self.assertEqual(pdm.taxa(), taxa[1:])
+        self.assertTrue(np.allclose(pdm.dm(norm=False), test_tree['pd_mat'][np.ix_(keep, keep)]))
+
     def test_tree_set_branch_lengths(self):
         test_tree = get_test_tree(10, trifurication=True)
         pdm = PhyloDM.load_from_dendropy(test_tree['tree'])
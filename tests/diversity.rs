@@ -0,0 +1,119 @@
+#[cfg(test)]
+mod tests {
+    use ndarray::Array2;
+    use phylodm::diversity::{diversity, Metric};
+    use phylodm::tree::{Edge, NodeId, Taxon};
+    use phylodm::PDM;
+
+    /// Deterministic pseudo-random communities, including empty and single taxon samples.
+    fn communities(n_samples: usize, n_taxa: usize) -> Array2<f64> {
+        let mut community = Array2::<f64>::zeros([n_samples, n_taxa]);
+        let mut state: u64 = 42;
+        for i in 2..n_samples {
+            for j in 0..n_taxa {
+                state = state.wrapping_mul(6364136223846793005).wrapping_add(1442695040888963407);
+                let value = (state >> 33) % 5;
+                community[[i, j]] = if value < 2 { 0.0 } else { value as f64 };
+            }
+        }
+        community[[1, 3]] = 2.0;
+        community
+    }
+
+    /// Faith's PD by walking from each present taxon to the root.
+    fn brute_pd(tree: &PDM, present: &[usize]) -> f64 {
+        let mut seen = vec![false; tree.n_nodes()];
+        let mut pd = 0.0;
+        for &row_idx in present {
+            let mut node_id: NodeId = tree.row_idx_to_leaf_idx[row_idx];
+            while let Some(parent) = tree.get_node(node_id).parent {
+                if !seen[node_id.0] {
+                    seen[node_id.0] = true;
+                    pd += tree.get_node(node_id).parent_distance.unwrap_or(Edge(0.0)).0;
+                }
+                node_id = parent;
+            }
+        }
+        pd
+    }
+
+    #[test]
+    fn test_diversity() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (_, arr) = tree.matrix(false).unwrap();
+        let n_taxa = tree.n_leaf_nodes();
+
+        let community = communities(20, n_taxa);
+        let metrics = [Metric::Pd, Metric::Mpd, Metric::Mntd];
+
+        for abundance_weighted in [false, true] {
+            let result = diversity(&mut tree, &community, &metrics, abundance_weighted, 3).unwrap();
+            for i in 0..20 {
+                let present: Vec<usize> = (0..n_taxa).filter(|&j| community[[i, j]] > 0.0).collect();
+                let weight = |j: usize| if abundance_weighted { community[[i, j]] } else { 1.0 };
+                assert!((result[[i, 0]] - brute_pd(&tree, &present)).abs() < 1e-9);
+
+                if present.len() < 2 {
+                    assert!(result[[i, 1]].is_nan());
+                    assert!(result[[i, 2]].is_nan());
+                    continue;
+                }
+
+                // MPD, the weighted form includes the diagonal (as in picante)
+                let (mut num, mut denom) = (0.0, 0.0);
+                for &a in &present {
+                    for &b in &present {
+                        if a != b || abundance_weighted {
+                            num += weight(a) * weight(b) * arr[[a, b]];
+                            denom += weight(a) * weight(b);
+                        }
+                    }
+                }
+                assert!((result[[i, 1]] - num / denom).abs() < 1e-9);
+
+                // MNTD
+                let (mut num, mut denom) = (0.0, 0.0);
+                for &a in &present {
+                    let nearest = present.iter().filter(|&&b| b != a).map(|&b| arr[[a, b]]).fold(f64::INFINITY, f64::min);
+                    num += weight(a) * nearest;
+                    denom += weight(a);
+                }
+                assert!((result[[i, 2]] - num / denom).abs() < 1e-9);
+            }
+        }
+    }
+
+    #[test]
+    fn test_diversity_errors() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+
+        let community = Array2::<f64>::zeros([2, 3]);
+        assert!(diversity(&mut tree, &community, &[Metric::Pd], false, 1).is_err());
+
+        let mut community = Array2::<f64>::zeros([2, 10]);
+        community[[0, 0]] = -1.0;
+        assert!(diversity(&mut tree, &community, &[Metric::Pd], false, 1).is_err());
+        assert!(Metric::from_name("unknown").is_err());
+    }
+
+    #[test]
+    fn test_diversity_taxa_order() {
+        // Taxa are added out of order, the community columns are in sorted order.
+        let mut tree = PDM::default();
+        let root = tree.add_internal_node();
+        for (taxon, length) in [("C", 3.0), ("A", 1.0), ("B", 2.0)] {
+            let leaf = tree.add_leaf_node(&Taxon(taxon.to_string())).unwrap();
+            tree.add_edge(root, leaf, Edge(length));
+        }
+        let mut community = Array2::<f64>::zeros([1, 3]);
+        community[[0, 0]] = 1.0;
+        community[[0, 2]] = 1.0;
+
+        let result = diversity(&mut tree, &community, &[Metric::Pd, Metric::Mpd], false, 1).unwrap();
+        assert_eq!(result[[0, 0]], 4.0);
+        assert_eq!(result[[0, 1]], 4.0);
+        assert_eq!(tree.leaf_nodes().unwrap()[2], Taxon("C".to_string()));
+    }
+}
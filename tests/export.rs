@@ -0,0 +1,163 @@
+#[cfg(test)]
+mod tests {
+    use std::fs;
+    use std::path::PathBuf;
+
+    use phylodm::export::{npy_header, write_matrix, write_matrix_to_path, write_taxa_to_path, Codec, Format};
+    use phylodm::PDM;
+
+    fn write_to_vec(format: Format, norm: bool, n_threads: usize) -> Vec<u8> {
+        let mut tree = PDM::default();
+        let _ = tree.read_newick_path("tests/test.tree");
+        let mut out = Vec::new();
+        write_matrix(&mut tree, &mut out, format, norm, n_threads).unwrap();
+        out
+    }
+
+    /// Return a path in the temporary directory that does not exist.
+    fn tmp_path(name: &str) -> PathBuf {
+        let path = std::env::temp_dir().join(format!("phylodm_{}_{name}", std::process::id()));
+        let _ = fs::remove_file(&path);
+        path
+    }
+
+    /// Write the matrix to a file, returning its (uncompressed) contents.
+    fn write_to_path(name: &str) -> Vec<u8> {
+        let mut tree = PDM::default();
+        let _ = tree.read_newick_path("tests/test.tree");
+        let path = tmp_path(name);
+        write_matrix_to_path(&mut tree, path.to_str().unwrap(), false, 2).unwrap();
+        let bytes = fs::read(&path).unwrap();
+        fs::remove_file(&path).unwrap();
+        match Codec::from_path(name) {
+            Codec::None => bytes,
+            #[cfg(feature = "flate2")]
+            Codec::Gzip => {
+                let mut out = Vec::new();
+                std::io::Read::read_to_end(&mut flate2::read::GzDecoder::new(&bytes[..]), &mut out).unwrap();
+                out
+            }
+            #[cfg(feature = "zstd")]
+            Codec::Zstd => zstd::stream::decode_all(&bytes[..]).unwrap(),
+            #[allow(unreachable_patterns)]
+            codec => panic!("{codec:?} compression is not available"),
+        }
+    }
+
+    fn f64_values(bytes: &[u8]) -> Vec<f64> {
+        bytes.chunks(8).map(|x| f64::from_le_bytes(x.try_into().unwrap())).collect()
+    }
+
+    #[test]
+    fn test_write_tsv() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (taxa, arr) = tree.matrix(false).unwrap();
+
+        let out = String::from_utf8(write_to_vec(Format::Tsv, false, 1)).unwrap();
+        let lines: Vec<&str> = out.lines().collect();
+        assert_eq!(lines.len(), taxa.len() + 1);
+        assert_eq!(lines[0], "\tT1\tT10\tT2\tT3\tT4\tT5\tT6\tT7\tT8\tT9");
+        for (i, line) in lines[1..].iter().enumerate() {
+            let fields: Vec<&str> = line.split('\t').collect();
+            assert_eq!(fields[0], taxa[i].0);
+            for (j, field) in fields[1..].iter().enumerate() {
+                assert_eq!(field.parse::<f64>().unwrap(), arr[[i, j]]);
+            }
+        }
+    }
+
+    #[test]
+    fn test_write_phylip() {
+        let out = String::from_utf8(write_to_vec(Format::Phylip, false, 1)).unwrap();
+        let lines: Vec<&str> = out.lines().collect();
+        assert_eq!(lines[0], "10");
+        assert_eq!(lines[1], "T1 0 84 72 31 85 72 55 47 71 75");
+    }
+
+    #[test]
+    fn test_write_npy() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (_, arr) = tree.matrix(true).unwrap();
+
+        let out = write_to_vec(Format::Npy, true, 1);
+        let header = npy_header(10);
+        assert_eq!(header.len() % 64, 0);
+        assert_eq!(&out[..header.len()], &header[..]);
+
+        let values = f64_values(&out[header.len()..]);
+        assert_eq!(values.len(), 100);
+        for i in 0..10 {
+            for j in 0..10 {
+                assert_eq!(values[i * 10 + j], arr[[i, j]]);
+            }
+        }
+    }
+
+    #[test]
+    fn test_write_condensed() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (_, arr) = tree.matrix(false).unwrap();
+
+        let values = f64_values(&write_to_vec(Format::Condensed, false, 1));
+        let mut expected = Vec::new();
+        for i in 0..10 {
+            for j in i + 1..10 {
+                expected.push(arr[[i, j]]);
+            }
+        }
+        assert_eq!(values, expected);
+    }
+
+    #[test]
+    fn test_write_threads() {
+        for format in [Format::Tsv, Format::Phylip, Format::Npy, Format::Condensed] {
+            assert_eq!(write_to_vec(format, true, 1), write_to_vec(format, true, 4));
+        }
+    }
+
+    #[test]
+    fn test_format_from_path() {
+        assert_eq!(Format::from_path("a.tsv").unwrap(), Format::Tsv);
+        assert_eq!(Format::from_path("a.phylip.zst").unwrap(), Format::Phylip);
+        assert_eq!(Format::from_path("a.npy.gz").unwrap(), Format::Npy);
+        assert_eq!(Format::from_path("a.condensed.bin").unwrap(), Format::Condensed);
+        assert!(Format::from_path("a.bin").is_err());
+    }
+
+    #[test]
+    fn test_write_matrix_to_path() {
+        assert_eq!(write_to_path("test.tsv"), write_to_vec(Format::Tsv, false, 1));
+        assert_eq!(write_to_path("test.npy"), write_to_vec(Format::Npy, false, 1));
+
+        let mut tree = PDM::default();
+        let _ = tree.read_newick_path("tests/test.tree");
+        let path = tmp_path("test.taxa.txt");
+        write_taxa_to_path(&mut tree, path.to_str().unwrap()).unwrap();
+        assert_eq!(fs::read_to_string(&path).unwrap(), "T1\nT10\nT2\nT3\nT4\nT5\nT6\nT7\nT8\nT9\n");
+        fs::remove_file(&path).unwrap();
+
+        assert!(write_matrix_to_path(&mut tree, "test.unknown", false, 1).is_err());
+    }
+
+    #[cfg(feature = "compression")]
+    #[test]
+    fn test_write_matrix_to_path_compressed() {
+        assert_eq!(write_to_path("test.tsv.gz"), write_to_vec(Format::Tsv, false, 1));
+        assert_eq!(write_to_path("test.condensed.bin.zst"), write_to_vec(Format::Condensed, false, 1));
+    }
+
+    #[test]
+    fn test_write_matrix_to_path_compression_unavailable() {
+        // The file must not be created (or truncated) if the codec is unavailable.
+        let mut tree = PDM::default();
+        let _ = tree.read_newick_path("tests/test.tree");
+        for name in ["test.tsv.gz", "test.tsv.zst"].into_iter().filter(|name| !Codec::from_path(name).is_available()) {
+            let path = tmp_path(name);
+            assert!(write_matrix_to_path(&mut tree, path.to_str().unwrap(), false, 1).is_err());
+            assert!(!path.exists());
+        }
+    }
+}
@@ -1,6 +1,6 @@
 #[cfg(test)]
 mod tests {
-    use phylodm::tree::{Edge, Taxon};
+    use phylodm::tree::{Edge, NodeId, Taxon};
     use phylodm::PDM;
 
     #[test]
@@ -409,4 +409,224 @@ mod tests {
             ]
         );
     }
+
+    #[test]
+    fn test_matrix_tile() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (_, arr) = tree.matrix(false).unwrap();
+        let (_, arr_norm) = tree.matrix(true).unwrap();
+
+        let n_taxa = tree.n_leaf_nodes();
+        for (rows, cols) in tree.tile_plan(4, 3).unwrap().into_iter().flatten() {
+            let tile = tree.matrix_tile(rows.clone(), cols.clone(), false).unwrap();
+            let tile_norm = tree.matrix_tile(rows.clone(), cols.clone(), true).unwrap();
+            for (i, row_idx) in rows.clone().enumerate() {
+                for (j, col_idx) in cols.clone().enumerate() {
+                    assert_eq!(tile[[i, j]], arr[[row_idx, col_idx]]);
+                    assert_eq!(tile_norm[[i, j]], arr_norm[[row_idx, col_idx]]);
+                }
+            }
+        }
+
+        // Only the nodes spanning the columns are visited, check every column range.
+        for col_start in 0..n_taxa {
+            for col_end in col_start..=n_taxa {
+                let tile = tree.matrix_tile(0..n_taxa, col_start..col_end, false).unwrap();
+                for i in 0..n_taxa {
+                    for (j, col_idx) in (col_start..col_end).enumerate() {
+                        assert_eq!(tile[[i, j]], arr[[i, col_idx]]);
+                    }
+                }
+            }
+        }
+        assert!(tree.matrix_tile(0..n_taxa + 1, 0..1, false).is_err());
+        assert!(tree.tile_plan(0, 3).is_err());
+        assert!(tree.tile_plan(4, 0).is_err());
+    }
+
+    #[test]
+    fn test_matrix_tile_without_row_vec() {
+        let mut tree = PDM::default();
+        let _ = tree.read_newick_path("tests/test.tree");
+        assert!(tree.row_vec.is_none());
+
+        let tile = tree.matrix_tile(0..3, 7..10, false).unwrap();
+        assert_eq!(tile[[0, 0]], 47.0);
+        assert_eq!(tile[[1, 1]], 27.0);
+        assert_eq!(tile[[2, 2]], 19.0);
+        assert!(tree.row_vec.is_none());
+    }
+
+    /// Check the incrementally updated row vector matches a full re-computation.
+    fn assert_row_vec_matches_recompute(tree: &mut PDM) {
+        let taxa = tree.leaf_nodes().unwrap();
+        let row_vec = tree.row_vec.clone().unwrap();
+        tree.compute_row_vec().unwrap();
+        assert_eq!(tree.leaf_nodes().unwrap(), taxa);
+        assert_eq!(tree.row_vec.as_ref().unwrap(), &row_vec);
+    }
+
+    #[test]
+    fn test_insert_leaf() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+
+        // Split the edge above a leaf
+        let t8 = tree.get_taxon_node_idx(&Taxon("T8".to_string()));
+        tree.insert_leaf(t8, &Taxon("T0".to_string()), Edge(3.0), Some(Edge(1.0))).unwrap();
+        assert_eq!(tree.distance(&Taxon("T0".to_string()), &Taxon("T8".to_string()), false), 4.0);
+        assert_eq!(tree.distance(&Taxon("T0".to_string()), &Taxon("T2".to_string()), false), 7.0);
+        assert_row_vec_matches_recompute(&mut tree);
+
+        // Split the edge above an internal node, and attach directly to an internal node
+        let t3_parent = tree.get_node(tree.get_taxon_node_idx(&Taxon("T3".to_string()))).parent.unwrap();
+        tree.insert_leaf(t3_parent, &Taxon("T55".to_string()), Edge(2.0), Some(Edge(4.0))).unwrap();
+        assert_row_vec_matches_recompute(&mut tree);
+        tree.insert_leaf(t3_parent, &Taxon("T99".to_string()), Edge(5.0), None).unwrap();
+        assert_row_vec_matches_recompute(&mut tree);
+        assert_eq!(tree.n_leaf_nodes(), 13);
+
+        // Invalid insertions
+        let root = tree.root_node().unwrap();
+        assert!(tree.insert_leaf(root, &Taxon("T1".to_string()), Edge(1.0), None).is_err());
+        assert!(tree.insert_leaf(root, &Taxon("X".to_string()), Edge(1.0), Some(Edge(1.0))).is_err());
+        assert!(tree.insert_leaf(t8, &Taxon("X".to_string()), Edge(1.0), None).is_err());
+        assert!(tree.insert_leaf(t8, &Taxon("X".to_string()), Edge(1.0), Some(Edge(2.0))).is_err());
+        assert!(tree.insert_leaf(NodeId(1000), &Taxon("X".to_string()), Edge(1.0), None).is_err());
+    }
+
+    #[test]
+    fn test_prune_leaf() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (_, arr) = tree.matrix(false).unwrap();
+        let length = tree.length().0;
+
+        tree.prune_leaf(&Taxon("T6".to_string())).unwrap();
+        assert_eq!(tree.n_leaf_nodes(), 9);
+        assert_eq!(tree.n_nodes(), 17);
+        assert_eq!(tree.length().0, length - 12.0);
+        assert_eq!(tree.distance(&Taxon("T1".to_string()), &Taxon("T10".to_string()), false), arr[[0, 1]]);
+        assert_row_vec_matches_recompute(&mut tree);
+
+        // Prune until a single taxon remains
+        for taxon in ["T8", "T1", "T3", "T2", "T10", "T9", "T5", "T7"] {
+            tree.prune_leaf(&Taxon(taxon.to_string())).unwrap();
+            assert_row_vec_matches_recompute(&mut tree);
+        }
+        assert_eq!(tree.leaf_nodes().unwrap(), vec![Taxon("T4".to_string())]);
+        assert!(tree.prune_leaf(&Taxon("T4".to_string())).is_err());
+        assert!(tree.prune_leaf(&Taxon("T1".to_string())).is_err());
+    }
+
+    #[test]
+    fn test_insert_then_prune_leaf() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (taxa, arr) = tree.matrix(false).unwrap();
+
+        let t5 = tree.get_taxon_node_idx(&Taxon("T5".to_string()));
+        tree.insert_leaf(t5, &Taxon("T50".to_string()), Edge(1.5), Some(Edge(0.5))).unwrap();
+        tree.prune_leaf(&Taxon("T50".to_string())).unwrap();
+
+        let (taxa_after, arr_after) = tree.matrix(false).unwrap();
+        assert_eq!(taxa, taxa_after);
+        assert_eq!(arr, arr_after);
+        assert_row_vec_matches_recompute(&mut tree);
+    }
+
+    #[test]
+    fn test_prune_leaf_without_row_vec() {
+        // The taxa have not been ordered, nor the row vector computed.
+        let mut tree = PDM::default();
+        let root = tree.add_internal_node();
+        let internal = tree.add_internal_node();
+        tree.add_edge(root, internal, Edge(1.0));
+        for (parent, taxon, length) in [(root, "C", 4.0), (internal, "B", 3.0), (internal, "A", 2.0)] {
+            let leaf = tree.add_leaf_node(&Taxon(taxon.to_string())).unwrap();
+            tree.add_edge(parent, leaf, Edge(length));
+        }
+        tree.prune_leaf(&Taxon("B".to_string())).unwrap();
+        let (taxa, arr) = tree.matrix(false).unwrap();
+        assert_eq!(taxa, vec![Taxon("A".to_string()), Taxon("C".to_string())]);
+        assert_eq!(arr[[0, 1]], 7.0);
+
+        // A taxon inserted without a row vector is appended, then pruned.
+        let mut expected = PDM::default();
+        let _ = expected.load_from_newick_path("tests/test.tree");
+        let mut tree = PDM::default();
+        let _ = tree.read_newick_path("tests/test.tree");
+        let t5 = tree.get_taxon_node_idx(&Taxon("T5".to_string()));
+        tree.insert_leaf(t5, &Taxon("T0".to_string()), Edge(1.5), Some(Edge(0.5))).unwrap();
+        tree.prune_leaf(&Taxon("T0".to_string())).unwrap();
+        tree.prune_leaf(&Taxon("T3".to_string())).unwrap();
+        expected.prune_leaf(&Taxon("T3".to_string())).unwrap();
+        assert!(tree.row_vec.is_none());
+        assert_eq!(tree.matrix(false).unwrap(), expected.matrix(false).unwrap());
+    }
+
+    #[test]
+    fn test_insert_leaf_invalid() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let t8 = tree.get_taxon_node_idx(&Taxon("T8".to_string()));
+        let taxon = Taxon("T0".to_string());
+        let (n_nodes, row_vec) = (tree.n_nodes(), tree.row_vec.clone());
+
+        assert!(tree.insert_leaf(t8, &taxon, Edge(1.0), Some(Edge(f64::NAN))).is_err());
+        assert!(tree.insert_leaf(t8, &taxon, Edge(1.0), Some(Edge(-1.0))).is_err());
+        assert!(tree.insert_leaf(t8, &taxon, Edge(f64::NAN), Some(Edge(1.0))).is_err());
+        assert!(tree.insert_leaf(t8, &taxon, Edge(f64::INFINITY), Some(Edge(1.0))).is_err());
+        assert!(tree.insert_leaf(t8, &taxon, Edge(-1.0), Some(Edge(1.0))).is_err());
+
+        assert_eq!(tree.n_nodes(), n_nodes);
+        assert_eq!(tree.row_vec, row_vec);
+
+        // Splitting the edge above an internal node without any taxa below it, the distances
+        // between taxa are unaffected by this node so the row vector is restored.
+        let root = tree.root_node().unwrap();
+        let empty = tree.add_internal_node();
+        tree.add_edge(root, empty, Edge(2.0));
+        tree.row_vec = row_vec.clone();
+        assert!(tree.insert_leaf(empty, &taxon, Edge(1.0), Some(Edge(1.0))).is_err());
+        assert_eq!(tree.n_nodes(), n_nodes + 1);
+        assert_eq!(tree.row_vec, row_vec);
+    }
+
+    #[test]
+    fn test_prune_internal_taxon() {
+        // A labelled internal node (e.g. a rank label) is a taxon, but can not be pruned.
+        let mut tree = PDM::default();
+        let root = tree.add_internal_node();
+        let labelled = tree.add_leaf_node(&Taxon("X".to_string())).unwrap();
+        tree.add_edge(root, labelled, Edge(1.0));
+        for (parent, taxon, length) in [(root, "A", 2.0), (labelled, "B", 3.0), (labelled, "C", 4.0)] {
+            let leaf = tree.add_leaf_node(&Taxon(taxon.to_string())).unwrap();
+            tree.add_edge(parent, leaf, Edge(length));
+        }
+        let expected = tree.matrix(false).unwrap();
+        assert!(tree.prune_leaf(&Taxon("X".to_string())).is_err());
+        assert_eq!(tree.n_nodes(), 5);
+        assert_eq!(tree.matrix(false).unwrap(), expected);
+    }
+
+    #[test]
+    fn test_matrix_cached_row_vec() {
+        let mut tree = PDM::default();
+        let _ = tree.load_from_newick_path("tests/test.tree");
+        let (_, arr) = tree.matrix(false).unwrap();
+        let t1 = tree.get_taxon_node_idx(&Taxon("T1".to_string()));
+        let length = tree.get_node(t1).parent_distance.unwrap();
+
+        // Modifying a node directly does not update the cached row vector, until it is computed.
+        tree.get_node_mut(t1).set_parent_distance(Edge(length.0 + 1.0));
+        assert_eq!(tree.matrix(false).unwrap().1, arr);
+        tree.compute_row_vec().unwrap();
+        assert_eq!(tree.matrix(false).unwrap().1[[0, 1]], arr[[0, 1]] + 1.0);
+
+        // Methods on the tree keep it up to date.
+        tree.update_edge_lengths(&[t1], &[length]).unwrap();
+        assert_eq!(tree.matrix(false).unwrap().1, arr);
+    }
 }